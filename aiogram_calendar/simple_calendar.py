@@ -11,8 +11,6 @@ from aiogram.fsm.context import FSMContext
 from app.states import Register
 from aiogram import F, Router
 from aiogram.fsm.state import State
-import os
-import json
 
 
 class SimpleCalendar(GenericCalendar):
@@ -156,44 +154,6 @@ class SimpleCalendar(GenericCalendar):
         )
 
     async def handle_back_action(self, query: CallbackQuery, state: FSMContext):
-        def creates_keyboard(machine_list):
-            buttons = []
-            for i in range(0, len(machine_list), 2):
-                row = []
-                # Добавляем первую кнопку в ряд
-                row.append(InlineKeyboardButton(
-                    text=machine_list[i]['name'], callback_data=machine_list[i]['name']))
-                # Проверяем, есть ли следующая кнопка
-                if i + 1 < len(machine_list):
-                    row.append(InlineKeyboardButton(
-                        text=machine_list[i + 1]['name'], callback_data=machine_list[i + 1]['name']))
-                else:
-                    # Если следующей кнопки нет, добавляем пустую кнопку
-                    row.append(InlineKeyboardButton(
-                        text=" ", callback_data="ignore"))
-                buttons.append(row)
-            # Добавляем кнопку "Назад" на всю ширину
-            buttons.append([InlineKeyboardButton(
-                text=" ↩️ Назад", callback_data='back_2')])
-            # Создаем и возвращаем InlineKeyboardMarkup с кнопками
-            return InlineKeyboardMarkup(inline_keyboard=buttons)
-
-        def load_machines():
-            if os.path.exists("json/machines_data.json"):
-                with open("json/machines_data.json", 'r', encoding='utf-8') as file:
-                    return json.load(file)
-            else:
-                return {
-                    "maschines_1": [],
-                    "maschines_2": [],
-                    "maschines_3": [],
-                    "maschines_11": [],
-                    "maschines_15": [],
-                    "maschines_17": [],
-                    "maschines_20": [],
-                    "maschines_26": [],
-                    "maschines_kmt": [],
-                }
         # Логика для обработки действия "назад"
         current_state = await state.get_state()
         # await query.message.answer(f"Текущее состояние: {current_state}")
@@ -204,36 +164,14 @@ class SimpleCalendar(GenericCalendar):
                     locale=await get_user_locale(query.from_user)).start_calendar())
             await state.set_state(Register.date_start)
         else:
-            shops_1 = creates_keyboard(load_machines()['maschines_1'])
-            shops_2 = creates_keyboard(load_machines()['maschines_2'])
-            shops_3 = creates_keyboard(load_machines()['maschines_3'])
-            shops_11 = creates_keyboard(load_machines()['maschines_11'])
-            shops_15 = creates_keyboard(load_machines()['maschines_15'])
-            shops_17 = creates_keyboard(load_machines()['maschines_17'])
-            shops_20 = creates_keyboard(load_machines()['maschines_20'])
-            shops_26 = creates_keyboard(load_machines()['maschines_26'])
-            shops_kmt = creates_keyboard(load_machines()['maschines_kmt'])
             previous_data = await state.get_data()
             previous_state = previous_data.get('previous_state')
             await state.set_state(previous_state)
-            if previous_state == Register.machine_selection_1.state:
-                await query.message.edit_text('Выберите станок', reply_markup=shops_1)
-            elif previous_state == Register.machine_selection_2.state:
-                await query.message.edit_text('Выберите станок', reply_markup=shops_2)
-            elif previous_state == Register.machine_selection_3.state:
-                await query.message.edit_text('Выберите станок', reply_markup=shops_3)
-            elif previous_state == Register.machine_selection_11.state:
-                await query.message.edit_text('Выберите станок', reply_markup=shops_11)
-            elif previous_state == Register.machine_selection_15.state:
-                await query.message.edit_text('Выберите станок', reply_markup=shops_15)
-            elif previous_state == Register.machine_selection_17.state:
-                await query.message.edit_text('Выберите станок', reply_markup=shops_17)
-            elif previous_state == Register.machine_selection_20.state:
-                await query.message.edit_text('Выберите станок', reply_markup=shops_20)
-            elif previous_state == Register.machine_selection_26.state:
-                await query.message.edit_text('Выберите станок', reply_markup=shops_26)
-            elif previous_state == Register.machine_selection_kmt.state:
-                await query.message.edit_text('Выберите станок', reply_markup=shops_kmt)
+            shop_number = previous_data.get('selected_shop', '').split('-')[0]
+            machine_selection = getattr(Register, f'machine_selection_{shop_number}', None)
+            if machine_selection is not None and previous_state == machine_selection.state:
+                await query.message.edit_text(
+                    'Выберите станок', reply_markup=kb.shop_keyboards.get(shop_number))
 
     async def today_button(self, query: CallbackQuery, state: FSMContext):
         current_state = await state.get_state()
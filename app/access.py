@@ -0,0 +1,120 @@
+import logging
+from datetime import datetime
+from enum import IntEnum
+from app.database import UPDATED_AT_FORMAT, pool, write_queue
+
+logger = logging.getLogger(__name__)
+
+
+class Role(IntEnum):
+    """Уровень доступа; старшая роль больше младшей, проверки — сравнение чисел."""
+
+    NONE = 0
+    USER = 1
+    ADMIN = 2
+    MAIN_ADMIN = 3
+
+    @property
+    def title(self):
+        """Название роли для пользователей ("👑 Главный администратор!" и т. д.) или None."""
+        return ROLE_NAMES.get(self)
+
+    @property
+    def column(self) -> str:
+        """Значение колонки users.role ('user', 'admin', 'main_admin')."""
+        return self.name.lower()
+
+
+ROLE_NAMES = {
+    Role.MAIN_ADMIN: "👑 Главный администратор!",
+    Role.ADMIN: "🛠 Администратор!",
+    Role.USER: "👥 Пользователь",
+}
+
+
+class AccessStore:
+    """Права доступа из таблицы users и их копия в памяти.
+
+    Копия загружается load() при запуске (и после восстановления БД), роль
+    пользователя определяется по словарю id -> Role за O(1). Изменения идут
+    через очередь записи одной командой с условием на текущую роль, поэтому
+    одновременные правки двух администраторов не затирают друг друга; после
+    записи строка пользователя перечитывается из БД.
+    """
+
+    def __init__(self, pool):
+        self.pool = pool
+        self._roles = {}
+
+    async def load(self):
+        """Загружает всех пользователей из БД."""
+        async with self.pool.reader() as db:
+            async with db.execute(
+                    "SELECT telegram_id, role FROM users ORDER BY created_at, rowid") as cursor:
+                rows = await cursor.fetchall()
+        self._roles = {telegram_id: Role[role.upper()] for telegram_id, role in rows}
+        logger.info("Права доступа загружены: " + ", ".join(
+            f"{role.column} {len(self.members(role))}" for role in ROLE_NAMES))
+
+    async def _reload_user(self, user_id: int):
+        async with self.pool.reader() as db:
+            async with db.execute("SELECT role FROM users WHERE telegram_id = ?", (user_id,)) as cursor:
+                row = await cursor.fetchone()
+        if row is None:
+            self._roles.pop(user_id, None)
+        else:
+            self._roles[user_id] = Role[row[0].upper()]
+
+    def level(self, user_id: int) -> Role:
+        """Уровень доступа пользователя (Role.NONE, если доступа нет)."""
+        return self._roles.get(user_id, Role.NONE)
+
+    def role(self, user_id: int):
+        """Название роли пользователя ("👑 Главный администратор!" и т. д.) или None."""
+        return self.level(user_id).title
+
+    def members(self, role: Role) -> list:
+        """ID пользователей с этой ролью в порядке добавления."""
+        return [user_id for user_id, user_role in self._roles.items() if user_role == role]
+
+    def all_ids(self) -> set:
+        return set(self._roles)
+
+    async def grant(self, user_id: int, role: Role, replace=()) -> bool:
+        """Выдаёт роль role новому пользователю или пользователю с ролью из replace.
+
+        Возвращает False, если роль не выдана: у пользователя уже другая роль
+        (в том числе если её только что поменял другой администратор).
+        """
+        now = datetime.now().strftime(UPDATED_AT_FORMAT)
+        replaceable = [r.column for r in replace]
+        sql = "INSERT INTO users (telegram_id, role, created_at, updated_at) VALUES (?, ?, ?, ?) "
+        if replaceable:
+            sql += (
+                "ON CONFLICT(telegram_id) DO UPDATE SET role = excluded.role, updated_at = excluded.updated_at "
+                f"WHERE users.role IN ({', '.join('?' for _ in replaceable)})")
+        else:
+            sql += "ON CONFLICT(telegram_id) DO NOTHING"
+
+        async def op(db):
+            cursor = await db.execute(sql, (user_id, role.column, now, now, *replaceable))
+            return cursor.rowcount > 0
+
+        changed = await write_queue.submit(op)
+        await self._reload_user(user_id)
+        return changed
+
+    async def revoke(self, user_id: int, role: Role) -> bool:
+        """Удаляет пользователя, если у него роль role. Возвращает False, если удалять было нечего."""
+        async def op(db):
+            cursor = await db.execute(
+                "DELETE FROM users WHERE telegram_id = ? AND role = ?", (user_id, role.column))
+            return cursor.rowcount > 0
+
+        changed = await write_queue.submit(op)
+        await self._reload_user(user_id)
+        return changed
+
+
+# Общие права доступа для всех модулей бота
+access = AccessStore(pool)
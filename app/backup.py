@@ -0,0 +1,255 @@
+import asyncio
+import logging
+import os
+import shutil
+import sqlite3
+import time
+from datetime import datetime
+from app.database import DB_PATH, MIGRATIONS, ConnectionPool, pool
+from app.migrations import migrate
+from app.access import access
+from app.catalog import catalog
+
+logger = logging.getLogger(__name__)
+
+BACKUP_DIR = 'backup'
+BACKUP_PREFIX = 'Копия_БД_'
+# Сколько полных копий хранить (старые удаляются)
+BACKUP_KEEP = 5
+# Имена копий, которые сейчас отправляются во внешние хранилища; ротация их не удаляет
+uploading = set()
+# Сколько страниц БД копируется за один шаг backup API
+BACKUP_PAGES_PER_STEP = 256
+# Прогресс сообщается при каждом новом шаге в столько процентов
+PROGRESS_STEP = 10
+# Колонки tasks, которые есть во всех версиях схемы (для сравнения со старыми копиями)
+DIFF_COLUMNS = (
+    'date', 'workers', 'work_description', 'work_solution', 'fault_status',
+    'start_time', 'end_time', 'duration', 'shift', 'machine', 'inventory_number',
+)
+
+
+class BackupError(RuntimeError):
+    """Копия не создана или не прошла проверку целостности."""
+
+
+def list_backups():
+    """Имена файлов копий, новые первыми."""
+    if not os.path.exists(BACKUP_DIR):
+        return []
+    files = [
+        f for f in os.listdir(BACKUP_DIR)
+        if f.startswith(BACKUP_PREFIX) and f.endswith('.db')
+    ]
+    files.sort(key=lambda x: os.path.getctime(os.path.join(BACKUP_DIR, x)), reverse=True)
+    return files
+
+
+def _copy_database(source_path: str, target_path: str, pages: int, report):
+    """Копирует БД через sqlite3 backup API и проверяет результат (выполняется в потоке)."""
+    source = sqlite3.connect(source_path)
+    target = sqlite3.connect(target_path)
+    try:
+        # Шаги по pages страниц; если другой процесс пишет в базу,
+        # SQLite сам начинает копирование заново, так что копия согласованна
+        source.backup(target, pages=pages,
+                      progress=lambda status, remaining, total: report(total - remaining, total))
+        result = target.execute("PRAGMA integrity_check").fetchall()
+    finally:
+        target.close()
+        source.close()
+    if result != [('ok',)]:
+        raise BackupError(f"Проверка целостности копии не пройдена: {result[:3]}")
+
+
+async def backup_database(target_path: str, source_path: str = DB_PATH,
+                          pages: int = BACKUP_PAGES_PER_STEP, on_progress=None):
+    """Онлайн-копия БД в target_path, не блокируя цикл событий.
+
+    Копирование идёт в отдельном потоке шагами по pages страниц, параллельно с
+    работой бота. on_progress(percent) — необязательная корутина, вызывается
+    из цикла событий при каждом новом шаге в PROGRESS_STEP процентов.
+    Копия сначала пишется во временный файл и появляется только после
+    успешной проверки PRAGMA integrity_check.
+    """
+    if not os.path.exists(source_path):
+        raise FileNotFoundError("Исходная база данных не найдена")
+
+    loop = asyncio.get_running_loop()
+    progress = asyncio.Queue()
+
+    def report(copied, total):
+        percent = copied * 100 // total if total else 100
+        loop.call_soon_threadsafe(progress.put_nowait, percent)
+
+    partial_path = target_path + '.part'
+    copy_task = asyncio.ensure_future(
+        asyncio.to_thread(_copy_database, source_path, partial_path, pages, report))
+    last_reported = -PROGRESS_STEP
+    try:
+        while not copy_task.done() or not progress.empty():
+            getter = asyncio.ensure_future(progress.get())
+            await asyncio.wait({getter, copy_task}, return_when=asyncio.FIRST_COMPLETED)
+            if not getter.done():
+                getter.cancel()
+                continue
+            percent = getter.result()
+            if on_progress is not None and percent - last_reported >= PROGRESS_STEP:
+                last_reported = percent
+                await on_progress(percent)
+        await copy_task
+        os.replace(partial_path, target_path)
+    finally:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+
+
+async def create_backup(on_progress=None):
+    """Создаёт копию в BACKUP_DIR, оставляя не больше BACKUP_KEEP копий. Возвращает имя файла."""
+    os.makedirs(BACKUP_DIR, exist_ok=True)
+
+    timestamp = datetime.now().strftime("%d.%m.%Y_%H-%M-%S")
+    backup_filename = f"{BACKUP_PREFIX}{timestamp}.db"
+    await backup_database(os.path.join(BACKUP_DIR, backup_filename), on_progress=on_progress)
+
+    # Ротация — только после того, как новая копия проверена
+    for old_file in list_backups()[BACKUP_KEEP:]:
+        if old_file in uploading:
+            continue  # Удалится при следующей ротации, когда отправка закончится
+        os.remove(os.path.join(BACKUP_DIR, old_file))
+
+    logger.info(f"Создана резервная копия {backup_filename}")
+    return backup_filename
+
+
+def _verify_database(path: str):
+    """Проверяет файл БД перед подменой: целостность и версия схемы (выполняется в потоке)."""
+    db = sqlite3.connect(path)
+    try:
+        result = db.execute("PRAGMA integrity_check").fetchall()
+        version = db.execute("PRAGMA user_version").fetchone()[0]
+    finally:
+        db.close()
+    if result != [('ok',)]:
+        raise BackupError(f"Копия повреждена: {result[:3]}")
+    latest = max(m.version for m in MIGRATIONS)
+    if version > latest:
+        raise BackupError(f"Версия схемы копии {version} новее поддерживаемой ({latest})")
+
+
+async def stage_backup(backup_path: str) -> str:
+    """Копирует файл копии рядом с рабочей БД (без паузы) и возвращает путь к нему."""
+    staging_path = DB_PATH + '.restore'
+    await asyncio.to_thread(shutil.copyfile, backup_path, staging_path)
+    return staging_path
+
+
+async def _migrate_staged(staging_path: str):
+    """Доводит схему подготовленного файла до текущей версии своим пулом соединений."""
+    staged = ConnectionPool(staging_path, readers=1)
+    try:
+        await migrate(staged, MIGRATIONS)
+        # Всё из WAL — в сам файл: при подмене переносится только он
+        async with staged.writer() as db:
+            await db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    finally:
+        await staged.close()
+
+
+async def swap_database(staging_path: str) -> float:
+    """Подменяет рабочую БД подготовленным файлом staging_path.
+
+    Файл проверяется и миграциями доводится до текущей схемы заранее, без
+    остановки бота. Затем пул ставится на паузу (новые запросы ждут, текущие
+    завершаются), закрывается, файл атомарно переименовывается поверх
+    DB_PATH, старые -wal/-shm удаляются, пул открывается, права доступа и
+    справочник станков перечитываются из новой БД.
+    Возвращает длительность паузы записи в секундах.
+    """
+    try:
+        await asyncio.to_thread(_verify_database, staging_path)
+        await _migrate_staged(staging_path)
+        started = time.perf_counter()
+        async with pool.paused():
+            await pool.close()
+            os.replace(staging_path, DB_PATH)
+            # WAL прежней базы нельзя применять к новой
+            for suffix in ('-wal', '-shm'):
+                if os.path.exists(DB_PATH + suffix):
+                    os.remove(DB_PATH + suffix)
+            await pool.open()
+            # Права доступа и справочник станков — из восстановленных таблиц
+            await access.load()
+            await catalog.load()
+        pause = time.perf_counter() - started
+    finally:
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(staging_path + suffix):
+                os.remove(staging_path + suffix)
+    logger.info(f"БД восстановлена из копии, запись была приостановлена на {pause * 1000:.0f} мс")
+    return pause
+
+
+def _diff_databases(live_path: str, backup_path: str) -> dict:
+    """Сравнивает tasks рабочей БД и копии одной SQL-сессией (выполняется в потоке)."""
+    db = sqlite3.connect(f"file:{live_path}?mode=ro", uri=True)
+    try:
+        db.execute("ATTACH DATABASE ? AS bk", (f"file:{backup_path}?mode=ro",))
+        backup_columns = {row[1] for row in db.execute("PRAGMA bk.table_info(tasks)")}
+        summary = {'removed': 0, 'restored': 0, 'changed': 0, 'by_shop': {}}
+
+        def add(kind, rows):
+            for shop, count in rows:
+                summary[kind] += count
+                shop_summary = summary['by_shop'].setdefault(
+                    shop or 'Не указан', {'removed': 0, 'restored': 0, 'changed': 0})
+                shop_summary[kind] += count
+
+        if not backup_columns:
+            # В копии нет таблицы tasks: после восстановления пропадут все записи
+            add('removed', db.execute("SELECT shift, COUNT(*) FROM main.tasks GROUP BY shift"))
+            return summary
+
+        # Записи, которых нет в копии (пропадут) и которые есть только в копии (вернутся);
+        # наличие проверяется по первичному ключу
+        add('removed', db.execute("""
+            SELECT l.shift, COUNT(*) FROM main.tasks l
+            WHERE NOT EXISTS (SELECT 1 FROM bk.tasks b WHERE b.id = l.id)
+            GROUP BY l.shift
+        """))
+        add('restored', db.execute("""
+            SELECT b.shift, COUNT(*) FROM bk.tasks b
+            WHERE NOT EXISTS (SELECT 1 FROM main.tasks l WHERE l.id = b.id)
+            GROUP BY b.shift
+        """))
+
+        if 'updated_at' in backup_columns:
+            # Изменённые после копии: диапазон по индексу updated_at рабочей БД
+            since = db.execute("SELECT MAX(updated_at) FROM bk.tasks").fetchone()[0] or ''
+            add('changed', db.execute("""
+                SELECT l.shift, COUNT(*) FROM main.tasks l
+                JOIN bk.tasks b ON b.id = l.id
+                WHERE l.updated_at > ? AND l.updated_at IS NOT b.updated_at
+                GROUP BY l.shift
+            """, (since,)))
+        else:
+            # Копия старше колонки updated_at — сравниваем содержимое записей
+            differs = " OR ".join(f"l.{c} IS NOT b.{c}" for c in DIFF_COLUMNS)
+            add('changed', db.execute(f"""
+                SELECT l.shift, COUNT(*) FROM main.tasks l
+                JOIN bk.tasks b ON b.id = l.id
+                WHERE {differs}
+                GROUP BY l.shift
+            """))
+        return summary
+    finally:
+        db.close()
+
+
+async def diff_with_database(backup_path: str) -> dict:
+    """Что изменит восстановление из backup_path.
+
+    Возвращает {'removed': пропадут, 'restored': вернутся, 'changed': откатятся,
+    'by_shop': {цех: те же счётчики}}.
+    """
+    return await asyncio.to_thread(_diff_databases, DB_PATH, backup_path)
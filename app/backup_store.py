@@ -0,0 +1,214 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+import zlib
+from datetime import datetime, timedelta
+from app.backup import backup_database
+
+logger = logging.getLogger(__name__)
+
+STORE_DIR = 'backup/store'
+# Архив WAL для PITR: сегменты базового снимка лежат в <WAL_ARCHIVE_DIR>/<id снимка>/
+WAL_ARCHIVE_DIR = 'backup/wal'
+# Размер куска в страницах БД: изменение одной записи затрагивает один-два куска
+CHUNK_PAGES = 16
+# Сколько дней хранить снимки (самый свежий хранится всегда)
+SNAPSHOT_KEEP_DAYS = 30
+COMPRESS_LEVEL = 6
+
+
+class BackupStore:
+    """Хранилище инкрементальных снимков БД с дедупликацией.
+
+    Снимок режется на куски по CHUNK_PAGES страниц; каждый кусок хранится
+    один раз, сжатым zlib, под своим sha256 в chunks/. Манифест снимка
+    (manifests/<id>.json) — список хешей кусков по порядку, по нему снимок
+    собирается обратно. Неизменённые страницы между снимками не дублируются.
+    """
+
+    def __init__(self, path: str = STORE_DIR):
+        self.path = path
+        self.chunks_dir = os.path.join(path, 'chunks')
+        self.manifests_dir = os.path.join(path, 'manifests')
+        # Запись кусков с манифестом и очистка не идут одновременно: иначе
+        # очистка удалит куски снимка, манифест которого ещё не записан
+        self._lock = asyncio.Lock()
+
+    def chunk_path(self, digest: str) -> str:
+        return os.path.join(self.chunks_dir, digest[:2], digest)
+
+    def manifest_path(self, snapshot_id: str) -> str:
+        return os.path.join(self.manifests_dir, f"{snapshot_id}.json")
+
+    def list_snapshots(self):
+        """Манифесты снимков, новые первыми."""
+        if not os.path.exists(self.manifests_dir):
+            return []
+        manifests = []
+        for name in os.listdir(self.manifests_dir):
+            if name.endswith('.json'):
+                with open(os.path.join(self.manifests_dir, name), 'r', encoding='utf-8') as f:
+                    manifests.append(json.load(f))
+        manifests.sort(key=lambda m: (m['created'], m['id']), reverse=True)
+        return manifests
+
+    def get_snapshot(self, snapshot_id: str):
+        path = self.manifest_path(snapshot_id)
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _store_file(self, source_path: str, snapshot_id: str, created: str, extra: dict = None) -> dict:
+        """Режет файл на куски, дописывает новые куски и манифест (выполняется в потоке)."""
+        with open(source_path, 'rb') as f:
+            header = f.read(100)
+            # Размер страницы — 2 байта по смещению 16 заголовка SQLite (1 означает 65536)
+            page_size = int.from_bytes(header[16:18], 'big') or 4096
+            page_size = 65536 if page_size == 1 else page_size
+            chunk_size = page_size * CHUNK_PAGES
+            f.seek(0)
+
+            chunks, new_chunks, new_bytes, size = [], 0, 0, 0
+            while True:
+                data = f.read(chunk_size)
+                if not data:
+                    break
+                size += len(data)
+                digest = hashlib.sha256(data).hexdigest()
+                chunks.append(digest)
+                chunk_path = self.chunk_path(digest)
+                if os.path.exists(chunk_path):
+                    continue
+                os.makedirs(os.path.dirname(chunk_path), exist_ok=True)
+                packed = zlib.compress(data, COMPRESS_LEVEL)
+                with open(chunk_path + '.tmp', 'wb') as out:
+                    out.write(packed)
+                os.replace(chunk_path + '.tmp', chunk_path)
+                new_chunks += 1
+                new_bytes += len(packed)
+
+        manifest = {
+            'id': snapshot_id,
+            'created': created,
+            'page_size': page_size,
+            'chunk_size': chunk_size,
+            'size': size,
+            'chunks': chunks,
+            'new_chunks': new_chunks,
+            'new_bytes': new_bytes,
+            **(extra or {}),
+        }
+        os.makedirs(self.manifests_dir, exist_ok=True)
+        path = self.manifest_path(snapshot_id)
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False)
+        # link не заменяет существующий файл, в отличие от replace: чужой манифест не затирается
+        try:
+            os.link(path + '.tmp', path)
+        finally:
+            os.remove(path + '.tmp')
+        return manifest
+
+    async def snapshot(self, on_progress=None, extra: dict = None, source_path: str = None) -> dict:
+        """Делает снимок БД: согласованная копия через backup API, затем куски в хранилище.
+
+        extra — дополнительные поля манифеста (например, отметка базового снимка PITR).
+        source_path — уже готовая согласованная копия БД: тогда режется она, а
+        рабочая БД заново не копируется.
+        """
+        now = datetime.now()
+        # Микросекунды в id: два снимка в одну секунду (автокопия и новая
+        # цепочка PITR после восстановления) не должны попасть в один манифест
+        snapshot_id = now.strftime("%Y%m%d_%H%M%S_%f")
+        if os.path.exists(self.manifest_path(snapshot_id)):
+            raise FileExistsError(f"Снимок {snapshot_id} уже существует")
+        os.makedirs(self.path, exist_ok=True)
+        staging_path = os.path.join(self.path, f"snapshot_{snapshot_id}.db")
+        try:
+            if source_path is None:
+                await backup_database(staging_path, on_progress=on_progress)
+            async with self._lock:
+                manifest = await asyncio.to_thread(
+                    self._store_file, source_path or staging_path, snapshot_id,
+                    now.isoformat(timespec='microseconds'), extra)
+        finally:
+            if os.path.exists(staging_path):
+                os.remove(staging_path)
+        logger.info(
+            f"Снимок {snapshot_id}: {len(manifest['chunks'])} кусков, новых {manifest['new_chunks']} "
+            f"({manifest['new_bytes'] // 1024} КБ)")
+        return manifest
+
+    def _restore_file(self, manifest: dict, target_path: str):
+        with open(target_path + '.tmp', 'wb') as out:
+            for digest in manifest['chunks']:
+                with open(self.chunk_path(digest), 'rb') as f:
+                    data = zlib.decompress(f.read())
+                if hashlib.sha256(data).hexdigest() != digest:
+                    raise ValueError(f"Кусок {digest} повреждён")
+                out.write(data)
+        os.replace(target_path + '.tmp', target_path)
+
+    async def restore(self, snapshot_id: str, target_path: str):
+        """Собирает снимок в файл target_path (с проверкой хешей кусков)."""
+        manifest = self.get_snapshot(snapshot_id)
+        if manifest is None:
+            raise FileNotFoundError(f"Снимок {snapshot_id} не найден")
+        try:
+            await asyncio.to_thread(self._restore_file, manifest, target_path)
+        finally:
+            if os.path.exists(target_path + '.tmp'):
+                os.remove(target_path + '.tmp')
+
+    def _gc(self, keep_days: int):
+        started = time.time()
+        snapshots = self.list_snapshots()
+        cutoff = (datetime.now() - timedelta(days=keep_days)).isoformat(timespec='seconds')
+        # Самый свежий снимок и действующий базовый снимок PITR хранятся всегда:
+        # без базы архивировать WAL некуда
+        keep = {snapshots[0]['id']} if snapshots else set()
+        base = next((manifest for manifest in snapshots if manifest.get('pitr_base')), None)
+        if base is not None:
+            keep.add(base['id'])
+        removed = 0
+        for manifest in snapshots:
+            if manifest['id'] not in keep and manifest['created'] < cutoff:
+                os.remove(self.manifest_path(manifest['id']))
+                removed += 1
+
+        # Сегменты WAL удаляются вместе со своим базовым снимком
+        if os.path.exists(WAL_ARCHIVE_DIR):
+            for base_id in os.listdir(WAL_ARCHIVE_DIR):
+                if not os.path.exists(self.manifest_path(base_id)):
+                    shutil.rmtree(os.path.join(WAL_ARCHIVE_DIR, base_id), ignore_errors=True)
+
+        used = {digest for manifest in self.list_snapshots() for digest in manifest['chunks']}
+        freed = 0
+        if os.path.exists(self.chunks_dir):
+            for prefix in os.listdir(self.chunks_dir):
+                prefix_dir = os.path.join(self.chunks_dir, prefix)
+                for name in os.listdir(prefix_dir):
+                    chunk_path = os.path.join(prefix_dir, name)
+                    # Недописанные и появившиеся после начала очистки куски не трогаем
+                    if name in used or name.endswith('.tmp') or os.path.getmtime(chunk_path) >= started:
+                        continue
+                    os.remove(chunk_path)
+                    freed += 1
+        return removed, freed
+
+    async def gc(self, keep_days: int = SNAPSHOT_KEEP_DAYS):
+        """Удаляет снимки старше keep_days (кроме последнего и базы PITR) и куски, на которые никто не ссылается."""
+        async with self._lock:
+            removed, freed = await asyncio.to_thread(self._gc, keep_days)
+        if removed or freed:
+            logger.info(f"Очистка хранилища копий: снимков удалено {removed}, кусков {freed}")
+        return removed, freed
+
+
+# Общее хранилище снимков для автокопирования и восстановления
+store = BackupStore()
@@ -0,0 +1,265 @@
+import abc
+import asyncio
+import hashlib
+import hmac
+import json
+import logging
+import os
+import random
+import shutil
+from datetime import datetime, timezone
+from urllib.parse import quote, urlsplit
+from xml.etree import ElementTree
+import aiohttp
+from yarl import URL
+from app.backup_store import store
+
+logger = logging.getLogger(__name__)
+
+# Размер куска при потоковой передаче файла и размер части multipart-загрузки S3
+STREAM_CHUNK_SIZE = 256 * 1024
+S3_PART_SIZE = 8 * 1024 * 1024
+# Повторы при сетевых ошибках: число попыток и начальная задержка (секунды, удваивается)
+UPLOAD_ATTEMPTS = 5
+UPLOAD_BACKOFF = 1.0
+# Какие куски хранилища снимков уже отправлены в каждое место назначения
+SHIPPED_FILE = 'backup/store/shipped_{name}.json'
+
+
+class BackupTarget(abc.ABC):
+    """Место назначения копий. Наследники реализуют upload(path, key)."""
+
+    name = 'target'
+
+    @abc.abstractmethod
+    async def upload(self, path: str, key: str):
+        """Загружает локальный файл path под именем key."""
+
+
+class LocalDirectoryTarget(BackupTarget):
+    """Каталог (например, смонтированный сетевой диск) как место назначения копий."""
+
+    def __init__(self, directory: str, name: str = 'local'):
+        self.directory = directory
+        self.name = name
+
+    def _copy(self, path: str, key: str):
+        target_path = os.path.join(self.directory, *key.split('/'))
+        os.makedirs(os.path.dirname(target_path), exist_ok=True)
+        with open(path, 'rb') as source, open(target_path + '.part', 'wb') as target:
+            shutil.copyfileobj(source, target, STREAM_CHUNK_SIZE)
+        os.replace(target_path + '.part', target_path)
+
+    async def upload(self, path: str, key: str):
+        await asyncio.to_thread(self._copy, path, key)
+
+
+def _hmac(key: bytes, message: str) -> bytes:
+    return hmac.new(key, message.encode('utf-8'), hashlib.sha256).digest()
+
+
+class S3Target(BackupTarget):
+    """S3-совместимое хранилище (AWS S3, MinIO и т. п.), path-style адреса, подпись SigV4.
+
+    Файлы до S3_PART_SIZE отправляются одним PUT, крупнее — multipart-загрузкой.
+    Файл читается кусками, целиком в память не загружается.
+    """
+
+    def __init__(self, endpoint: str, bucket: str, access_key: str, secret_key: str,
+                 region: str = 'us-east-1', prefix: str = '', name: str = 's3'):
+        self.endpoint = endpoint.rstrip('/')
+        self.bucket = bucket
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.region = region
+        self.prefix = prefix
+        self.name = name
+
+    def _url(self, key: str) -> str:
+        return f"{self.endpoint}/{self.bucket}/{quote(self.prefix + key, safe='/~')}"
+
+    @staticmethod
+    def _canonical_query(query: dict) -> str:
+        return '&'.join(
+            f"{quote(k, safe='~')}={quote(str(v), safe='~')}" for k, v in sorted(query.items()))
+
+    def _sign(self, method: str, url: str, query: dict, headers: dict) -> dict:
+        """Добавляет к headers подпись AWS Signature Version 4."""
+        now = datetime.now(timezone.utc)
+        amz_date = now.strftime('%Y%m%dT%H%M%SZ')
+        scope = f"{now.strftime('%Y%m%d')}/{self.region}/s3/aws4_request"
+        headers = {
+            **headers,
+            'host': urlsplit(url).netloc,
+            'x-amz-date': amz_date,
+            'x-amz-content-sha256': headers.get('x-amz-content-sha256', 'UNSIGNED-PAYLOAD'),
+        }
+        signed = sorted(k.lower() for k in headers)
+        lower = {k.lower(): str(v).strip() for k, v in headers.items()}
+        canonical_request = '\n'.join([
+            method,
+            urlsplit(url).path,
+            self._canonical_query(query),
+            ''.join(f"{k}:{lower[k]}\n" for k in signed),
+            ';'.join(signed),
+            lower['x-amz-content-sha256'],
+        ])
+        string_to_sign = '\n'.join([
+            'AWS4-HMAC-SHA256', amz_date, scope,
+            hashlib.sha256(canonical_request.encode('utf-8')).hexdigest(),
+        ])
+        key = _hmac(('AWS4' + self.secret_key).encode('utf-8'), now.strftime('%Y%m%d'))
+        for part in (self.region, 's3', 'aws4_request'):
+            key = _hmac(key, part)
+        signature = hmac.new(key, string_to_sign.encode('utf-8'), hashlib.sha256).hexdigest()
+        headers['Authorization'] = (
+            f"AWS4-HMAC-SHA256 Credential={self.access_key}/{scope}, "
+            f"SignedHeaders={';'.join(signed)}, Signature={signature}")
+        return headers
+
+    async def _request(self, session, method: str, key: str, query: dict = None,
+                       headers: dict = None, data=None) -> tuple:
+        """Подписанный запрос с повторами. data — байты или функция, создающая тело заново."""
+        query = query or {}
+        url = self._url(key)
+        # Строка запроса собирается так же, как подписывается, и передаётся без перекодирования
+        request_url = URL(f"{url}?{self._canonical_query(query)}" if query else url, encoded=True)
+        for attempt in range(1, UPLOAD_ATTEMPTS + 1):
+            body = data() if callable(data) else data
+            signed_headers = self._sign(method, url, query, headers or {})
+            try:
+                async with session.request(method, request_url, headers=signed_headers,
+                                           data=body) as response:
+                    text = await response.text()
+                    if response.status < 300:
+                        return response.headers, text
+                    if response.status < 500 and response.status != 429:
+                        raise RuntimeError(f"S3 {method} {key}: {response.status} {text[:200]}")
+                    error = RuntimeError(f"S3 {method} {key}: {response.status}")
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                error = e
+            if attempt == UPLOAD_ATTEMPTS:
+                raise error
+            delay = UPLOAD_BACKOFF * 2 ** (attempt - 1) * (1 + random.random() / 2)
+            logger.warning(f"S3: попытка {attempt} не удалась ({error}), повтор через {delay:.1f} с")
+            await asyncio.sleep(delay)
+
+    @staticmethod
+    def _file_stream(path: str, offset: int = 0, length: int = None):
+        """Асинхронный генератор кусков файла (чтение в потоке, не блокирует цикл событий)."""
+        async def stream():
+            with open(path, 'rb') as f:
+                f.seek(offset)
+                remaining = length
+                while remaining is None or remaining > 0:
+                    size = STREAM_CHUNK_SIZE if remaining is None else min(STREAM_CHUNK_SIZE, remaining)
+                    chunk = await asyncio.to_thread(f.read, size)
+                    if not chunk:
+                        break
+                    if remaining is not None:
+                        remaining -= len(chunk)
+                    yield chunk
+        return stream()
+
+    async def upload(self, path: str, key: str):
+        size = os.path.getsize(path)
+        async with aiohttp.ClientSession() as session:
+            if size <= S3_PART_SIZE:
+                await self._request(
+                    session, 'PUT', key, headers={'Content-Length': str(size)},
+                    data=lambda: self._file_stream(path))
+                return
+            await self._multipart_upload(session, path, key, size)
+
+    async def _multipart_upload(self, session, path: str, key: str, size: int):
+        _, text = await self._request(session, 'POST', key, query={'uploads': ''})
+        upload_id = next(el.text for el in ElementTree.fromstring(text).iter() if el.tag.endswith('UploadId'))
+        parts = []
+        try:
+            for number, offset in enumerate(range(0, size, S3_PART_SIZE), 1):
+                length = min(S3_PART_SIZE, size - offset)
+                headers, _ = await self._request(
+                    session, 'PUT', key,
+                    query={'partNumber': str(number), 'uploadId': upload_id},
+                    headers={'Content-Length': str(length)},
+                    data=lambda offset=offset, length=length: self._file_stream(path, offset, length))
+                parts.append((number, headers.get('ETag', '')))
+            body = '<CompleteMultipartUpload>' + ''.join(
+                f"<Part><PartNumber>{n}</PartNumber><ETag>{etag}</ETag></Part>" for n, etag in parts
+            ) + '</CompleteMultipartUpload>'
+            payload = body.encode('utf-8')
+            await self._request(
+                session, 'POST', key, query={'uploadId': upload_id},
+                headers={'x-amz-content-sha256': hashlib.sha256(payload).hexdigest()},
+                data=payload)
+        except Exception:
+            try:
+                await self._request(session, 'DELETE', key, query={'uploadId': upload_id})
+            except Exception as e:
+                logger.warning(f"S3: не удалось отменить multipart-загрузку {upload_id}: {e}")
+            raise
+
+
+def configured_targets():
+    """Места назначения из переменных окружения: BACKUP_TARGET_DIR и/или S3_*."""
+    targets = []
+    if os.getenv('BACKUP_TARGET_DIR'):
+        targets.append(LocalDirectoryTarget(os.getenv('BACKUP_TARGET_DIR')))
+    if os.getenv('S3_ENDPOINT') and os.getenv('S3_BUCKET'):
+        targets.append(S3Target(
+            endpoint=os.getenv('S3_ENDPOINT'),
+            bucket=os.getenv('S3_BUCKET'),
+            access_key=os.getenv('S3_ACCESS_KEY', ''),
+            secret_key=os.getenv('S3_SECRET_KEY', ''),
+            region=os.getenv('S3_REGION', 'us-east-1'),
+            prefix=os.getenv('S3_PREFIX', 'bot-backups/'),
+        ))
+    return targets
+
+
+async def ship_file(path: str, key: str, targets=None):
+    """Отправляет файл во все места назначения; ошибка одного не мешает остальным."""
+    for target in targets if targets is not None else configured_targets():
+        try:
+            await target.upload(path, key)
+            logger.info(f"Копия {key} отправлена в {target.name}")
+        except Exception as e:
+            logger.error(f"Не удалось отправить {key} в {target.name}: {e}")
+
+
+def _load_shipped(name: str) -> set:
+    path = SHIPPED_FILE.format(name=name)
+    if not os.path.exists(path):
+        return set()
+    with open(path, 'r', encoding='utf-8') as f:
+        return set(json.load(f))
+
+
+def _save_shipped(name: str, shipped: set):
+    path = SHIPPED_FILE.format(name=name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(sorted(shipped), f)
+
+
+async def ship_snapshot(manifest: dict, targets=None):
+    """Отправляет снимок хранилища: недостающие куски, затем манифест.
+
+    Куски, уже отправленные в это место назначения раньше, повторно не передаются.
+    Манифест уходит последним, так что снимок на той стороне всегда полный.
+    """
+    for target in targets if targets is not None else configured_targets():
+        shipped = _load_shipped(target.name)
+        try:
+            for digest in manifest['chunks']:
+                if digest in shipped:
+                    continue
+                await target.upload(store.chunk_path(digest), f"store/chunks/{digest[:2]}/{digest}")
+                shipped.add(digest)
+            await target.upload(
+                store.manifest_path(manifest['id']), f"store/manifests/{manifest['id']}.json")
+            logger.info(f"Снимок {manifest['id']} отправлен в {target.name}")
+        except Exception as e:
+            logger.error(f"Не удалось отправить снимок {manifest['id']} в {target.name}: {e}")
+        finally:
+            _save_shipped(target.name, shipped)
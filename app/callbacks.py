@@ -0,0 +1,49 @@
+from enum import Enum
+
+from aiogram.filters.callback_data import CallbackData
+
+
+class ShopCallback(CallbackData, prefix='shop'):
+    """Кнопка цеха: 'shop:<цех>'."""
+    shop: str
+
+
+class MachineAction(str, Enum):
+    select = 'sel'
+    delete = 'del'
+
+
+class MachineCallback(CallbackData, prefix='m'):
+    """Кнопка станка: 'm:<цех>:<id станка>:<действие>'.
+
+    id — первичный ключ станка в таблице machines, станок по нему находит catalog.
+    """
+    shop: str
+    machine: int
+    action: MachineAction
+
+
+class RecordAction(str, Enum):
+    prev = 'prev'
+    next = 'next'
+
+
+class RecordCallback(CallbackData, prefix='rec'):
+    """Переход между найденными записями: 'rec:<действие>:<id записи>:<номер записи>'.
+
+    В кнопке — запись, от которой идёт переход, поэтому нажатие в старом
+    сообщении листает от показанной в нём записи, а не от последней в состоянии.
+    """
+    action: RecordAction
+    record_id: int
+    index: int
+
+
+class DateAction(str, Enum):
+    back = 'back'
+    confirm = 'ok'
+
+
+class DateCallback(CallbackData, prefix='date'):
+    """Подтверждение даты, выбранной в календаре: 'date:<действие>'."""
+    action: DateAction
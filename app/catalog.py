@@ -0,0 +1,125 @@
+import logging
+from datetime import datetime
+from app.database import UPDATED_AT_FORMAT, pool, write_queue
+
+logger = logging.getLogger(__name__)
+
+
+class Catalog:
+    """Справочник цехов и станков из таблиц shops/machines и его копия в памяти.
+
+    Копия загружается load() при запуске (и после восстановления БД); станок
+    по id, по имени в цехе и список станков цеха находятся за O(1), без
+    обращения к БД и файлам. Изменения идут через очередь записи, после чего
+    перечитывается только изменённый цех, а его номер версии растёт — по нему
+    клавиатуры понимают, что их пора пересобрать.
+    """
+
+    def __init__(self, pool):
+        self.pool = pool
+        self._shops = {}
+        self._machines = {}
+        self._by_shop = {}
+        self._by_name = {}
+        self._versions = {}
+        self._generation = 0
+
+    async def load(self):
+        """Загружает все цеха и станки из БД."""
+        async with self.pool.reader() as db:
+            async with db.execute("SELECT id, code, title FROM shops ORDER BY position") as cursor:
+                shops = await cursor.fetchall()
+        self._shops = {code: {'id': shop_id, 'code': code, 'title': title} for shop_id, code, title in shops}
+        self._machines = {}
+        self._by_shop = {}
+        self._by_name = {}
+        for code in self._shops:
+            await self._reload_shop(code)
+        logger.info(f"Справочник станков загружен: цехов {len(self._shops)}, станков {len(self._machines)}.")
+
+    async def _reload_shop(self, code: str):
+        async with self.pool.reader() as db:
+            async with db.execute(
+                    "SELECT id, name, inventory_number FROM machines "
+                    "WHERE shop_id = ? AND removed_at IS NULL ORDER BY position",
+                    (self._shops[code]['id'],)) as cursor:
+                rows = await cursor.fetchall()
+        for machine in self._by_shop.get(code, []):
+            self._machines.pop(machine['id'], None)
+            self._by_name.pop((code, machine['name'].lower()), None)
+        machines = [
+            {'id': machine_id, 'shop': code, 'name': name, 'inventory_number': inventory_number}
+            for machine_id, name, inventory_number in rows]
+        for machine in machines:
+            self._machines[machine['id']] = machine
+            self._by_name[(code, machine['name'].lower())] = machine
+        self._by_shop[code] = machines
+        self._generation += 1
+        self._versions[code] = self._generation
+
+    def shops(self) -> list:
+        """Цеха в порядке кнопок: [{'id', 'code', 'title'}, ...]."""
+        return list(self._shops.values())
+
+    def shop_title(self, code: str, default: str = 'Не указан') -> str:
+        """Название цеха ('🔧 1 цех') по коду ('1')."""
+        shop = self._shops.get(code)
+        return shop['title'] if shop else default
+
+    def machines(self, code: str) -> list:
+        """Станки цеха в порядке справочника."""
+        return self._by_shop.get(code, [])
+
+    def machine(self, machine_id: int):
+        """Станок ({'id', 'shop', 'name', 'inventory_number'}) или None, если его нет или он удалён."""
+        return self._machines.get(machine_id)
+
+    def find(self, code: str, name: str):
+        """Станок цеха по имени без учёта регистра или None."""
+        return self._by_name.get((code, name.lower()))
+
+    def version(self, code: str) -> int:
+        """Номер версии станков цеха; меняется при каждом перечитывании цеха."""
+        return self._versions.get(code, 0)
+
+    async def add_machine(self, code: str, name: str, inventory_number: str):
+        """Добавляет станок в конец цеха. Возвращает станок или None, если такое имя в цехе уже есть."""
+        if code not in self._shops:
+            return None
+        now = datetime.now().strftime(UPDATED_AT_FORMAT)
+
+        async def op(db):
+            cursor = await db.execute(
+                "INSERT OR IGNORE INTO machines (shop_id, name, inventory_number, position, created_at) "
+                "SELECT s.id, ?, ?, COALESCE((SELECT MAX(position) FROM machines WHERE shop_id = s.id), 0) + 1, ? "
+                "FROM shops s WHERE s.code = ?",
+                (name, inventory_number, now, code))
+            return cursor.lastrowid if cursor.rowcount > 0 else None
+
+        machine_id = await write_queue.submit(op)
+        await self._reload_shop(code)
+        return self.machine(machine_id) if machine_id else None
+
+    async def remove_machine(self, machine_id: int) -> bool:
+        """Удаляет станок из справочника. Возвращает False, если удалять было нечего.
+
+        Строка остаётся в таблице с отметкой removed_at, так что записи tasks
+        со ссылкой на станок не теряют его имя и цех.
+        """
+        machine = self.machine(machine_id)
+        if machine is None:
+            return False
+        now = datetime.now().strftime(UPDATED_AT_FORMAT)
+
+        async def op(db):
+            cursor = await db.execute(
+                "UPDATE machines SET removed_at = ? WHERE id = ? AND removed_at IS NULL", (now, machine_id))
+            return cursor.rowcount > 0
+
+        changed = await write_queue.submit(op)
+        await self._reload_shop(machine['shop'])
+        return changed
+
+
+# Общий справочник станков для всех модулей бота
+catalog = Catalog(pool)
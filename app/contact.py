@@ -6,6 +6,7 @@ import app.keyboards as kb
 import re
 from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
 from app.states import Register
+from app.access import Role
 
 router_contact = Router()
 
@@ -174,37 +175,10 @@ async def cancel_delete(callback_query: CallbackQuery, state: FSMContext):
     await state.clear()
 
 
-def load_access_data():
-    """Загружает данные пользователей из JSON-файла."""
-    try:
-        with open('json/access_user.json', "r", encoding="utf-8") as file:
-            return json.load(file)
-    except (FileNotFoundError, json.JSONDecodeError):
-        return {
-            "main_admins": [],
-            "admins": [],
-            "users": []
-        }
-
-
-def get_users_role(user_id, data):
-    if user_id in data['main_admins']:
-        return "👑 Главный администратор!"
-    elif user_id in data['admins']:
-        return "🛠 Администратор!"
-    elif user_id in data['users']:
-        return "👥 Пользователь"
-    return None
-
-
 # Обработка нажатия кнопки "Контакты"
 @router_contact.message(F.text == '/contacts')
-async def show_contacts(message: Message):
-    data = load_access_data()  # Загружаем данные о пользователях
-    user_id = message.from_user.id  # Получаем ID пользователя
-    # Определяем роль пользователя
-    role = get_users_role(user_id, data)
-    if role in ["👑 Главный администратор!", "🛠 Администратор!", "👥 Пользователь"]:
+async def show_contacts(message: Message, role: Role):
+    if role >= Role.USER:
         contacts_info = "Вот наши контакты:\n"
         contacts = load_contacts()
         for contact in contacts:
@@ -1,112 +0,0 @@
-shops = {
-    '1-shop': '🔧 1 цех',
-    '2-shop': '⚙️ 2 цех',
-    '3-shop': '🏭 3 цех',
-    '11-shop': '📦 11 цех',
-    '15-shop': '🔬 15 цех',
-    '17-shop': '🔥 17 цех',
-    '20-shop': '💡 20 цех',
-    '26-shop': '🛠️ 26 цех',
-    'kmt-shop': '⚙️ КМТ'
-}
-
-# maschines = {
-#     'charnaghi_5m': '🔧 Карнаги 5 метров',
-#     'charnaghi_4m': '🔩 Карнаги 4 метра',
-#     'sedin': '⚙️ Sedin Shies',
-#     'koelmann': '🔩 Koelmann',
-#     'Mecof cs_500': '🛠 Mecof CS-500',
-#     'Mecof_rev': '🔩 Mecof реберный',
-#     '1E516': '🎡 1E516 карусель',
-#     '1550': '🎡 1550 карусель',
-#     'Fadal': '🖥 Fadal',
-#     'insse_1': 'insse_1',
-#     'insse_2': 'insse_2',
-#     'starak': 'Starak',
-#     'okuma': 'Okuma'
-# }
-
-maschines_1 = [{'name': 'Koelmann', 'inventory_number': '4030-010'},
-               {'name': 'Carnaghi 4m', 'inventory_number': '4050-953'},
-               {'name': 'Fadal', 'inventory_number': '4014-674'},
-               {'name': 'Carnaghi 5m', 'inventory_number': '4050-959'},
-               {'name': 'Mecof CS500', 'inventory_number': '4037-387'},
-               {'name': 'Skoda W160HC', 'inventory_number': '4034-023'},
-               {'name': '1Е516ПФ', 'inventory_number': '4032-049'},
-               {'name': '1550Т', 'inventory_number': ''},
-               {'name': 'Hyundai L2600LY', 'inventory_number': ''},
-               {'name': 'МС613Ф2', 'inventory_number': ''},
-               {'name': 'Skoda S2500', 'inventory_number': ''},
-               {'name': 'HC 17', 'inventory_number': '4050-011'},
-               {'name': 'Mecof CSX', 'inventory_number': '4037-390'}
-               ]
-
-
-maschines_2 = [{'name': 'TACCHI HD 3/90H', 'inventory_number': '4030-049'},
-               {'name': 'Carnaghi 2m', 'inventory_number': '4037-388'},
-               {'name': 'Samat 400', 'inventory_number': '4000-940'},
-               {'name': '1А516МФ3', 'inventory_number': ''},
-               {'name': '2А622Ф4', 'inventory_number': ''},
-               {'name': 'INNSE WZ150', 'inventory_number': ''},
-               {'name': 'INNSE RAM', 'inventory_number': ''},
-               {'name': 'Pinacho ST 225x1000', 'inventory_number': ''},
-               {'name': 'SKI 20B', 'inventory_number': ''},
-               {'name': 'КУ80Л', 'inventory_number': ''},
-               {'name': 'INNSE FAB', 'inventory_number': ''},
-               {'name': '6Р13Ф3-01', 'inventory_number': '4014-457'},
-               {'name': 'Wohlenberg', 'inventory_number': ''}
-               ]
-
-
-maschines_3 = [{'name': 'Staragg HEC630H', 'inventory_number': '4034-537'},
-               {'name': '16М30Ф3171', 'inventory_number': ''},
-               {'name': 'НС212Ф2', 'inventory_number': ''},
-               {'name': 'Uniport 6000', 'inventory_number': '130000010418'},
-               {'name': 'Correanayak FP50', 'inventory_number': ''},
-               {'name': '65А90Ф1', 'inventory_number': '1300000019'},
-               {'name': 'Micamation SA 4000', 'inventory_number': ''},
-               {'name': 'Skoda FCW 150 NC', 'inventory_number': ''},
-               {'name': 'Taymak MCFH 63', 'inventory_number': ''},
-               {'name': 'Hyundai L400LMC', 'inventory_number': '130000010801'},
-               {'name': 'Okuma MA-650VB', 'inventory_number': ''}
-               ]
-
-
-maschines_11 = [{'name': 'Гранат М-2К', 'inventory_number': ''},
-                {'name': 'Hammerly', 'inventory_number': '4064-907'},
-                {'name': 'ByStar', 'inventory_number': ''},
-                {'name': 'BySprint', 'inventory_number': ''},
-                {'name': 'HJ 2160', 'inventory_number': ''},
-                {'name': 'Schuler', 'inventory_number': ''}
-                ]
-
-
-maschines_15 = [{'name': 'Micamation MI-355', 'inventory_number': ''},
-                {'name': 'Schuemann', 'inventory_number': ''},
-                {'name': 'Roebel BC 14720', 'inventory_number': ''},
-                {'name': 'HTBFM', 'inventory_number': ''},
-                {'name': 'TBFM', 'inventory_number': ''},
-                {'name': 'ЛИС 8000', 'inventory_number': ''},
-                {'name': 'ABB IRC5', 'inventory_number': ''}
-                ]
-
-
-maschines_17 = []
-
-
-maschines_20 = []
-
-
-maschines_26 = [{'name': 'LaborMax 4220-1T5A', 'inventory_number': ''},
-                {'name': 'CMS AQUATEC', 'inventory_number': '130000010625'},
-                {'name': 'Bystronic Byjet 3015', 'inventory_number': '4231-014'},
-                {'name': 'Okuma M460-VE №1', 'inventory_number': '130000010137'},
-                {'name': 'Okuma M460-VE №2', 'inventory_number': '130000010138'},
-                {'name': 'Кубань 1П5 32', 'inventory_number': '4032-023'}
-                ]
-
-
-maschines_kmt = [{'name': 'HOESCH MFD', 'inventory_number': '4050-014'}]
-
-all_machines = maschines_1 + maschines_2 + maschines_3 + maschines_11 + \
-    maschines_15 + maschines_17 + maschines_20 + maschines_26 + maschines_kmt
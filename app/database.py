@@ -1,9 +1,17 @@
 import aiosqlite
+import asyncio
+import json
+import os
 import re
 import logging
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta
 from aiogram import Router
-from app.data_shops import shops
+from cachetools import TTLCache
+from dotenv import load_dotenv
+from app.migrations import Migration, add_column, migrate, run_in_batches
+
+load_dotenv('token.env')  # Загружаем переменные окружения из .env файла
 
 router_database = Router()
 
@@ -13,6 +21,25 @@ logger = logging.getLogger(__name__)
 
 # Путь к БД (можно изменить, например, на 'data/bot_data.db')
 DB_PATH = 'bot_data.db'
+# Прежнее хранилище прав доступа: переносится в таблицу users миграцией 7
+LEGACY_ACCESS_FILE = 'json/access_user.json'
+# Прежний справочник станков: переносится в таблицу machines миграцией 8
+LEGACY_MACHINES_FILE = 'json/machines_data.json'
+
+# Количество соединений только для чтения в пуле (писатель всегда один)
+READER_POOL_SIZE = 3
+
+# Групповая фиксация записей: сколько ждать попутчиков (секунды) и
+# сколько операций максимум объединять в одну транзакцию
+WRITE_BATCH_WINDOW = 0.005
+WRITE_BATCH_SIZE = 100
+
+# Сколько записей поиска читается за один запрос (страница)
+SEARCH_PAGE_SIZE = 50
+
+# Кэш результатов поиска: сколько запросов хранить и сколько секунд (0 — кэш выключен)
+SEARCH_CACHE_SIZE = int(os.getenv('SEARCH_CACHE_SIZE', '256'))
+SEARCH_CACHE_TTL = int(os.getenv('SEARCH_CACHE_TTL', '600'))
 
 
 def normalize(s: str) -> str:
@@ -23,45 +50,515 @@ def normalize(s: str) -> str:
 
 
 async def register_normalize_function(db: aiosqlite.Connection):
-    await db.create_function("normalize", 1, normalize)
+    await db.create_function("normalize", 1, normalize, deterministic=True)
 
 
-async def search_data(phrase: str):
-    async with aiosqlite.connect(DB_PATH) as db:
+class ConnectionPool:
+    """Долгоживущие соединения с БД: один писатель и небольшой пул читателей.
+
+    База переводится в режим WAL, поэтому читатели не блокируют писателя и
+    друг друга. Соединения открываются один раз в init_db и закрываются
+    при остановке бота через close_db.
+
+    paused() временно закрывает доступ к БД (например, для подмены файла при
+    восстановлении): новые запросы ждут, а текущие успевают завершиться.
+    """
+
+    def __init__(self, path: str, readers: int = READER_POOL_SIZE):
+        self.path = path
+        self.readers_count = readers
+        self._writer = None
+        self._readers = asyncio.Queue()
+        self._connections = []
+        self._write_lock = asyncio.Lock()
+        self._open_lock = asyncio.Lock()
+        # Версия данных tasks: растёт после фиксации записи в tasks
+        # (WriteQueue с tasks=True) и после подмены файла БД (paused)
+        self.version = 0
+        # PRAGMA wal_autocheckpoint для новых соединений (None — по умолчанию SQLite)
+        self.wal_autocheckpoint = None
+        # Пропуск для новых запросов, число запросов в работе и событие «все завершены»
+        self._gate = asyncio.Event()
+        self._gate.set()
+        self._active = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._pause_owner = None
+        self._pause_lock = asyncio.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        return self._writer is not None
+
+    async def _connect(self, readonly: bool = False) -> aiosqlite.Connection:
+        db = await aiosqlite.connect(self.path)
+        await db.execute("PRAGMA journal_mode=WAL")
+        await db.execute("PRAGMA synchronous=NORMAL")
+        await db.execute("PRAGMA busy_timeout=5000")
+        if self.wal_autocheckpoint is not None:
+            await db.execute(f"PRAGMA wal_autocheckpoint={int(self.wal_autocheckpoint)}")
+        if readonly:
+            await db.execute("PRAGMA query_only=ON")
         await register_normalize_function(db)
+        self._connections.append(db)
+        return db
+
+    async def open(self):
+        """Открывает писателя и читателей (повторный вызов ничего не делает)."""
+        async with self._open_lock:
+            if self.is_open:
+                return
+            self._writer = await self._connect()
+            for _ in range(self.readers_count):
+                self._readers.put_nowait(await self._connect(readonly=True))
+            logger.info(
+                f"Пул соединений открыт: 1 писатель, {self.readers_count} читателей.")
+
+    async def close(self):
+        """Закрывает все соединения пула."""
+        async with self._open_lock:
+            if not self.is_open:
+                return
+            async with self._write_lock:
+                for db in self._connections:
+                    await db.close()
+                self._connections.clear()
+                self._readers = asyncio.Queue()
+                self._writer = None
+            logger.info("Пул соединений закрыт.")
 
-        normalized = normalize(phrase)
-        like = f"%{normalized}%"
-
-        query = """
-        SELECT id, date, workers, work_description, work_solution, fault_status,
-               start_time, end_time, duration, shift, machine, inventory_number
-        FROM tasks
-        WHERE normalize(date)             LIKE ?
-           OR normalize(workers)          LIKE ?
-           OR normalize(work_description) LIKE ?
-           OR normalize(work_solution)    LIKE ?
-           OR normalize(fault_status)     LIKE ?
-           OR normalize(machine)          LIKE ?
-           OR normalize(inventory_number) LIKE ?
-           OR normalize(shift)            LIKE ?
-        ORDER BY id DESC
+    @asynccontextmanager
+    async def _in_use(self):
+        """Учитывает запрос в работе; во время паузы ждёт её окончания.
+
+        Задача, поставившая паузу, проходит без ожидания (ей нужна БД для
+        переоткрытия и миграций).
         """
+        if asyncio.current_task() is not self._pause_owner:
+            await self._gate.wait()
+        self._active += 1
+        self._idle.clear()
+        try:
+            yield
+        finally:
+            self._active -= 1
+            if self._active == 0:
+                self._idle.set()
+
+    @asynccontextmanager
+    async def paused(self):
+        """Останавливает новые запросы и ждёт завершения текущих.
+
+        Внутри блока к БД обращается только вызвавшая задача. После выхода
+        версия данных увеличивается, чтобы кэши не отдавали прежние результаты.
+        """
+        async with self._pause_lock:
+            self._gate.clear()
+            self._pause_owner = asyncio.current_task()
+            try:
+                await self._idle.wait()
+                yield
+            finally:
+                self._pause_owner = None
+                self.version += 1
+                self._gate.set()
+
+    @asynccontextmanager
+    async def reader(self):
+        """Выдаёт соединение для чтения и возвращает его в пул после использования."""
+        async with self._in_use():
+            if not self.is_open:
+                await self.open()
+            db = await self._readers.get()
+            try:
+                yield db
+            finally:
+                self._readers.put_nowait(db)
+
+    @asynccontextmanager
+    async def writer(self):
+        """Выдаёт единственное соединение для записи; при ошибке откатывает транзакцию."""
+        async with self._in_use():
+            if not self.is_open:
+                await self.open()
+            async with self._write_lock:
+                try:
+                    yield self._writer
+                except Exception:
+                    await self._writer.rollback()
+                    raise
+
+
+class WriteQueue:
+    """Очередь записи с групповой фиксацией (group commit).
+
+    Операции — корутины вида op(db), которые пишут через соединение писателя,
+    но сами не делают commit. Фоновая задача собирает операции, пришедшие за
+    WRITE_BATCH_WINDOW, и выполняет их в одной транзакции: один COMMIT (и один
+    fsync) на всю пачку. Каждая операция идёт в своей точке сохранения, поэтому
+    ошибка одной откатывает только её и возвращается только её вызывающему.
+    Если в зафиксированной пачке есть удачная операция с tasks=True, версия
+    данных пула растёт — кэш поиска перестаёт отдавать прежние результаты.
+    """
+
+    def __init__(self, pool: ConnectionPool,
+                 window: float = WRITE_BATCH_WINDOW, max_batch: int = WRITE_BATCH_SIZE):
+        self.pool = pool
+        self.window = window
+        self.max_batch = max_batch
+        self._queue = asyncio.Queue()
+        self._task = None
+
+    def start(self):
+        """Запускает фоновую задачу фиксации (если она ещё не запущена)."""
+        if self._task is None or self._task.done():
+            self._queue = asyncio.Queue()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Дописывает уже поставленные операции и останавливает задачу."""
+        if self._task is None or self._task.done():
+            return
+        await self._queue.put(None)
+        await self._task
+        self._task = None
+
+    async def submit(self, op, tasks: bool = False):
+        """Ставит операцию в очередь и ждёт её результата (или её исключения).
+
+        tasks — операция меняет таблицу tasks (от этого зависит кэш поиска).
+        """
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((op, future, tasks))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            item = await self._queue.get()
+            if item is None:
+                break
+            batch = [item]
+            deadline = loop.time() + self.window
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            await self._commit(batch)
+
+    async def _commit(self, batch):
+        outcomes = []
+        tasks_changed = False
+        try:
+            async with self.pool.writer() as db:
+                await db.execute("BEGIN")
+                for op, future, tasks in batch:
+                    if future.cancelled():
+                        continue
+                    await db.execute("SAVEPOINT write_op")
+                    try:
+                        result = await op(db)
+                    except Exception as e:
+                        await db.execute("ROLLBACK TO write_op")
+                        await db.execute("RELEASE write_op")
+                        outcomes.append((future, None, e))
+                    else:
+                        await db.execute("RELEASE write_op")
+                        outcomes.append((future, result, None))
+                        tasks_changed = tasks_changed or tasks
+                await db.commit()
+            if tasks_changed:
+                self.pool.version += 1
+        except Exception as e:
+            # Транзакция не зафиксирована — ошибка касается всех операций пачки
+            logger.error(f"Ошибка групповой записи ({len(batch)} операций): {e}")
+            outcomes = [(future, None, e) for _, future, _ in batch]
+        for future, result, error in outcomes:
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+
+class SearchCache:
+    """LRU-кэш результатов поиска с ограничением по времени жизни.
+
+    В ключ входит версия данных пула, поэтому после записи в tasks или
+    восстановления БД старые результаты больше не находятся и вытесняются сами.
+    """
+
+    def __init__(self, pool: ConnectionPool, maxsize: int = SEARCH_CACHE_SIZE, ttl: int = SEARCH_CACHE_TTL):
+        self.pool = pool
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl) if maxsize > 0 and ttl > 0 else None
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, *parts):
+        return (self.pool.version, *parts)
+
+    def get(self, key):
+        if self._cache is None:
+            return None
+        value = self._cache.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def put(self, key, value):
+        if self._cache is not None:
+            self._cache[key] = value
 
-        params = (like, like, like, like, like, like, like, like)
+    def clear(self):
+        if self._cache is not None:
+            self._cache.clear()
 
+    def stats(self) -> dict:
+        """Счётчики попаданий/промахов и текущий размер кэша."""
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+            'size': len(self._cache) if self._cache is not None else 0,
+        }
+
+
+# Общий пул, которым пользуются все модули бота
+pool = ConnectionPool(DB_PATH)
+
+# Кэш поиска перед search_page/count_search
+search_cache = SearchCache(pool)
+
+# Общая очередь записи: add_data и правки записей идут через неё
+write_queue = WriteQueue(pool)
+
+
+async def close_db():
+    """Дописывает очередь записи и закрывает соединения с БД при остановке бота."""
+    await write_queue.stop()
+    await pool.close()
+
+
+# Колонки tasks, по которым работает поиск
+SEARCH_COLUMNS = (
+    'date', 'workers', 'work_description', 'work_solution',
+    'fault_status', 'machine', 'inventory_number', 'shift',
+)
+
+# Триграммный индекс по нормализованному тексту записи (колонка tasks.search_blob):
+# находит любые фрагменты ("4050-9", "516"), а не только целые слова.
+# Заполняется приложением в add_data и update_record_in_db вместе с search_blob.
+TRIGRAM_SCHEMA = '''
+    CREATE VIRTUAL TABLE IF NOT EXISTS tasks_trgm USING fts5(
+        blob, tokenize='trigram'
+    )
+'''
+
+# Окончательная проверка кандидата по сохранённому нормализованному тексту.
+# Колонки в search_blob разделены пробелом, а в нормализованной фразе пробелов нет,
+# поэтому это то же самое, что normalize(колонка) LIKE по каждой колонке.
+NORMALIZED_MATCH_SQL = "t.search_blob LIKE :like"
+
+# То же выражение на SQL — для заполнения search_blob у уже существующих записей
+SEARCH_BLOB_SQL = " || ' ' || ".join(f"normalize({c})" for c in SEARCH_COLUMNS)
+
+# Формат дат в tasks.start_time/end_time (так их вводят пользователи) и
+# формат ISO-колонок start_ts/end_ts, по которым строятся выборки за период.
+# ISO-строки в локальном времени сравниваются как текст и используют индекс.
+DISPLAY_TIME_FORMAT = '%d.%m.%Y %H:%M'
+ISO_TIME_FORMAT = '%Y-%m-%d %H:%M'
+# Формат tasks.updated_at — время последнего изменения записи (локальное)
+UPDATED_AT_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def iso_sql(column: str) -> str:
+    """SQL-выражение, переводящее 'дд.мм.гггг чч:мм' в ISO (NULL для других форматов)."""
+    return (
+        f"CASE WHEN {column} GLOB '[0-9][0-9].[0-9][0-9].[0-9][0-9][0-9][0-9] [0-9][0-9]:[0-9][0-9]*' "
+        f"THEN substr({column}, 7, 4) || '-' || substr({column}, 4, 2) || '-' || substr({column}, 1, 2)"
+        f" || ' ' || substr({column}, 12, 5) END"
+    )
+
+
+# Простой в минутах по ISO-колонкам (для заполнения старых записей)
+DURATION_MINUTES_SQL = "CAST(round((julianday(end_ts) - julianday(start_ts)) * 1440) AS INTEGER)"
+
+# Группировки для отчётов о простое по периодам (ключ — по окончанию работ)
+DOWNTIME_PERIODS = {
+    'day': "substr(end_ts, 1, 10)",
+    'week': "strftime('%Y-W%W', end_ts)",
+    'month': "substr(end_ts, 1, 7)",
+}
+
+
+def to_iso(value: str):
+    """Переводит 'дд.мм.гггг чч:мм' в 'гггг-мм-дд чч:мм'; None, если формат другой."""
+    try:
+        return datetime.strptime(value, DISPLAY_TIME_FORMAT).strftime(ISO_TIME_FORMAT)
+    except (TypeError, ValueError):
+        return None
+
+
+TASK_COLUMNS_SQL = """
+    t.id, t.date, t.workers, t.work_description, t.work_solution, t.fault_status,
+    t.start_time, t.end_time, t.duration, t.shift, t.machine, t.inventory_number
+"""
+
+
+def build_search_blob(record: dict) -> str:
+    """Склеивает нормализованные поисковые колонки записи (значение для tasks.search_blob)."""
+    return " ".join(normalize(record.get(column)) for column in SEARCH_COLUMNS)
+
+
+async def with_derived_columns(db: aiosqlite.Connection, task_id: int, updated_data: dict) -> dict:
+    """Дополняет изменения записи пересчитанными производными колонками.
+
+    search_blob и updated_at пересчитываются всегда (недостающие поисковые колонки
+    берутся из текущей версии записи), start_ts/end_ts — если меняется время работ.
+    """
+    derived = {'updated_at': datetime.now().strftime(UPDATED_AT_FORMAT)}
+    for column in ('start_time', 'end_time'):
+        if column in updated_data:
+            derived[column.replace('_time', '_ts')] = to_iso(updated_data[column])
+    async with db.execute(
+            f"SELECT {', '.join(SEARCH_COLUMNS)} FROM tasks WHERE id = ?", (task_id,)) as cursor:
+        row = await cursor.fetchone()
+    record = dict(zip(SEARCH_COLUMNS, row)) if row else {}
+    record.update(updated_data)
+    return {**updated_data, **derived, 'search_blob': build_search_blob(record)}
+
+
+async def index_task(db: aiosqlite.Connection, task_id: int, search_blob: str):
+    """Обновляет запись в триграммном индексе (в текущей транзакции вызывающего)."""
+    await db.execute("DELETE FROM tasks_trgm WHERE rowid = ?", (task_id,))
+    await db.execute(
+        "INSERT INTO tasks_trgm(rowid, blob) VALUES (?, ?)", (task_id, search_blob))
+
+
+def _search_sql(phrase: str):
+    """Части запроса поиска по фразе: FROM, условия WHERE, колонка id и параметры."""
+    normalized = normalize(phrase)
+    params = {"like": f"%{normalized}%"}
+    if len(normalized) >= 3:
+        # Кандидаты из триграммного индекса (подстрока нормализованного текста);
+        # ключ страниц — rowid индекса, чтобы FTS5 сам отдавал id по убыванию
+        params["match"] = f'"{normalized}"'
+        return ("FROM tasks_trgm JOIN tasks t ON t.id = tasks_trgm.rowid",
+                ["tasks_trgm MATCH :match", NORMALIZED_MATCH_SQL], "tasks_trgm.rowid", params)
+    if normalized:
+        # Триграммы не работают для 1-2 символов: такие запросы совпадают почти
+        # со всеми записями, поэтому просто проверяем сохранённый текст
+        return "FROM tasks t", [NORMALIZED_MATCH_SQL], "t.id", params
+    return "FROM tasks t", [], "t.id", params
+
+
+async def _fetch_search_page(phrase: str, before_id: int = None, after_id: int = None,
+                             limit: int = SEARCH_PAGE_SIZE) -> list:
+    """Страница результатов поиска прямо из БД, мимо search_cache."""
+    source, conditions, id_column, params = _search_sql(phrase)
+    order = "DESC"
+    if before_id is not None:
+        conditions.append(f"{id_column} < :before")
+        params["before"] = before_id
+    elif after_id is not None:
+        conditions.append(f"{id_column} > :after")
+        params["after"] = after_id
+        order = "ASC"
+    params["limit"] = limit
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    query = f"SELECT {TASK_COLUMNS_SQL} {source} {where} ORDER BY {id_column} {order} LIMIT :limit"
+
+    async with pool.reader() as db:
         async with db.execute(query, params) as cursor:
             rows = await cursor.fetchall()
             columns = [desc[0] for desc in cursor.description]
-            return [dict(zip(columns, row)) for row in rows]
+    if order == "ASC":
+        rows.reverse()
+    return [dict(zip(columns, row)) for row in rows]
 
 
+async def search_page(phrase: str, before_id: int = None, after_id: int = None,
+                      limit: int = SEARCH_PAGE_SIZE):
+    """Одна страница результатов поиска (новые записи сверху, ключ — id).
 
+    before_id — следующая страница (записи с меньшим id),
+    after_id — предыдущая (записи с большим id), без обоих — первая.
+    Пока данные не менялись, повторный запрос отдаётся из search_cache.
+    """
+    cache_key = search_cache.key('page', normalize(phrase), before_id, after_id, limit)
+    cached = search_cache.get(cache_key)
+    if cached is not None:
+        return [dict(row) for row in cached]
 
-async def init_db():
-    """Инициализация базы данных и создание таблицы tasks со всеми колонками."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        # Создание таблицы со всеми колонками
+    page = await _fetch_search_page(phrase, before_id, after_id, limit)
+    search_cache.put(cache_key, page)
+    return [dict(row) for row in page]
+
+
+async def count_search(phrase: str) -> int:
+    """Количество записей, подходящих под фразу (тоже через search_cache)."""
+    cache_key = search_cache.key('count', normalize(phrase))
+    cached = search_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    source, conditions, _, params = _search_sql(phrase)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    async with pool.reader() as db:
+        async with db.execute(f"SELECT COUNT(*) {source} {where}", params) as cursor:
+            count = (await cursor.fetchone())[0]
+    search_cache.put(cache_key, count)
+    return count
+
+
+async def iter_search(phrase: str, page_size: int = SEARCH_PAGE_SIZE):
+    """Асинхронный генератор по всем результатам поиска, постранично.
+
+    Соединение берётся только на время чтения страницы, в памяти — не больше page_size записей.
+    Страницы читаются мимо search_cache: полный проход (выгрузки) иначе вытеснил
+    бы из кэша страницы интерактивного поиска.
+    """
+    before_id = None
+    while True:
+        page = await _fetch_search_page(phrase, before_id=before_id, limit=page_size)
+        for row in page:
+            yield row
+        if len(page) < page_size:
+            return
+        before_id = page[-1]['id']
+
+
+async def search_data(phrase: str):
+    """Все результаты поиска списком (для выгрузок в файл)."""
+    return [row async for row in iter_search(phrase)]
+
+
+async def get_task(task_id: int):
+    """Запись по id в виде словаря (None, если её нет)."""
+    async with pool.reader() as db:
+        async with db.execute(f"SELECT {TASK_COLUMNS_SQL} FROM tasks t WHERE t.id = ?", (task_id,)) as cursor:
+            row = await cursor.fetchone()
+            if row is None:
+                return None
+            return dict(zip([desc[0] for desc in cursor.description], row))
+
+
+async def _create_tasks(pool: ConnectionPool):
+    async with pool.writer() as db:
         await db.execute('''
             CREATE TABLE IF NOT EXISTS tasks (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -80,7 +577,215 @@ async def init_db():
             )
         ''')
         await db.commit()
-    logger.info("База данных инициализирована.")
+
+
+async def _add_search_blob(pool: ConnectionPool):
+    # Нормализованный текст записи хранится в search_blob, чтобы поиск не вызывал
+    # normalize() для каждой строки; по нему строится триграммный индекс
+    async with pool.writer() as db:
+        await add_column(db, 'tasks', 'search_blob', 'TEXT')
+        # Словарный индекс tasks_fts больше не нужен: search_blob и триграммы
+        # дают точную семантику поиска по подстроке
+        for trigger in ('tasks_fts_ai', 'tasks_fts_ad', 'tasks_fts_au'):
+            await db.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        await db.execute("DROP TABLE IF EXISTS tasks_fts")
+        await db.execute("DROP TABLE IF EXISTS tasks_trgm")
+        await db.execute(TRIGRAM_SCHEMA)
+        await db.commit()
+    await run_in_batches(
+        pool, 'tasks',
+        f"UPDATE tasks SET search_blob = {SEARCH_BLOB_SQL} WHERE id > :lo AND id <= :hi")
+    await run_in_batches(
+        pool, 'tasks',
+        "INSERT INTO tasks_trgm(rowid, blob) SELECT id, search_blob FROM tasks WHERE id > :lo AND id <= :hi")
+
+
+async def _add_iso_timestamps(pool: ConnectionPool):
+    # Время работ в ISO для выборок за период по индексу
+    async with pool.writer() as db:
+        await add_column(db, 'tasks', 'start_ts', 'TEXT')
+        await add_column(db, 'tasks', 'end_ts', 'TEXT')
+        await db.commit()
+    await run_in_batches(
+        pool, 'tasks',
+        f"UPDATE tasks SET start_ts = {iso_sql('start_time')}, end_ts = {iso_sql('end_time')} "
+        "WHERE id > :lo AND id <= :hi")
+    async with pool.writer() as db:
+        await db.execute("CREATE INDEX IF NOT EXISTS idx_tasks_start_ts ON tasks(start_ts)")
+        await db.execute("CREATE INDEX IF NOT EXISTS idx_tasks_end_ts ON tasks(end_ts)")
+        await db.commit()
+
+
+async def _add_duration_minutes(pool: ConnectionPool):
+    # Простой в минутах рядом с текстовой длительностью
+    async with pool.writer() as db:
+        await add_column(db, 'tasks', 'duration_minutes', 'INTEGER')
+        await db.commit()
+    await run_in_batches(
+        pool, 'tasks',
+        f"UPDATE tasks SET duration_minutes = {DURATION_MINUTES_SQL} WHERE id > :lo AND id <= :hi")
+    async with pool.writer() as db:
+        # Покрывающий индекс для отчётов о простое: период, цех, станок, минуты
+        await db.execute(
+            "CREATE INDEX IF NOT EXISTS idx_tasks_downtime "
+            "ON tasks(end_ts, shift, machine, duration_minutes)")
+        await db.commit()
+
+
+async def _add_updated_at(pool: ConnectionPool):
+    # Время последнего изменения записи: по нему сравнение с резервной копией
+    # смотрит только записи, изменённые после неё. У старых записей — NULL
+    async with pool.writer() as db:
+        await add_column(db, 'tasks', 'updated_at', 'TEXT')
+        await db.execute("CREATE INDEX IF NOT EXISTS idx_tasks_updated_at ON tasks(updated_at)")
+        await db.commit()
+
+
+async def _enable_incremental_vacuum(pool: ConnectionPool):
+    # auto_vacuum=INCREMENTAL, чтобы обслуживание могло возвращать свободные
+    # страницы шагами (PRAGMA incremental_vacuum). Режим вступает в силу только
+    # после полного VACUUM — он выполняется один раз, здесь
+    async with pool.writer() as db:
+        async with db.execute("PRAGMA auto_vacuum") as cursor:
+            mode = (await cursor.fetchone())[0]
+        if mode != 2:
+            await db.commit()
+            await db.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            await db.execute("VACUUM")
+
+
+async def _create_users(pool: ConnectionPool):
+    # Пользователи и роли (раньше — три списка в json/access_user.json).
+    # Содержимое JSON переносится один раз; сам файл больше не читается
+    async with pool.writer() as db:
+        await db.execute("""
+            CREATE TABLE IF NOT EXISTS users (
+                telegram_id INTEGER PRIMARY KEY,
+                role TEXT NOT NULL CHECK (role IN ('user', 'admin', 'main_admin')),
+                created_at TEXT NOT NULL,
+                updated_at TEXT NOT NULL
+            )
+        """)
+        await db.execute("CREATE INDEX IF NOT EXISTS idx_users_role ON users(role)")
+        try:
+            with open(LEGACY_ACCESS_FILE, 'r', encoding='utf-8') as file:
+                groups = json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError) as e:
+            logger.warning(f"Файл {LEGACY_ACCESS_FILE} не перенесён: {e}")
+            groups = {}
+        now = datetime.now().strftime(UPDATED_AT_FORMAT)
+        # Старшая роль — первой: если id есть в нескольких списках, остаётся она
+        for group, role in (('main_admins', 'main_admin'), ('admins', 'admin'), ('users', 'user')):
+            await db.executemany(
+                "INSERT OR IGNORE INTO users (telegram_id, role, created_at, updated_at) VALUES (?, ?, ?, ?)",
+                [(int(user_id), role, now, now) for user_id in groups.get(group, [])])
+        await db.commit()
+        async with db.execute("SELECT COUNT(*) FROM users") as cursor:
+            count = (await cursor.fetchone())[0]
+    logger.info(f"Пользователей в таблице users: {count}")
+
+
+async def _create_catalog(pool: ConnectionPool):
+    # Цеха и станки (раньше — списки в app/data_shops.py и json/machines_data.json).
+    # Удалённый станок остаётся с отметкой removed_at: на его id ссылаются записи tasks.
+    # Содержимое JSON переносится один раз; сам файл больше не читается
+    async with pool.writer() as db:
+        await db.execute("""
+            CREATE TABLE IF NOT EXISTS shops (
+                id INTEGER PRIMARY KEY,
+                code TEXT NOT NULL UNIQUE,
+                title TEXT NOT NULL,
+                position INTEGER NOT NULL
+            )
+        """)
+        await db.execute("""
+            CREATE TABLE IF NOT EXISTS machines (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                shop_id INTEGER NOT NULL REFERENCES shops(id),
+                name TEXT NOT NULL,
+                inventory_number TEXT NOT NULL DEFAULT '',
+                position INTEGER NOT NULL,
+                created_at TEXT NOT NULL,
+                removed_at TEXT
+            )
+        """)
+        # Имя станка уникально в цехе среди неудалённых
+        await db.execute(
+            "CREATE UNIQUE INDEX IF NOT EXISTS idx_machines_shop_name "
+            "ON machines(shop_id, name) WHERE removed_at IS NULL")
+        await db.execute("CREATE INDEX IF NOT EXISTS idx_machines_shop ON machines(shop_id, position)")
+        await db.execute("CREATE INDEX IF NOT EXISTS idx_machines_inventory ON machines(inventory_number)")
+        shops = [
+            ('1', '🔧 1 цех'), ('2', '⚙️ 2 цех'), ('3', '🏭 3 цех'),
+            ('11', '📦 11 цех'), ('15', '🔬 15 цех'), ('17', '🔥 17 цех'),
+            ('20', '💡 20 цех'), ('26', '🛠️ 26 цех'), ('kmt', '⚙️ КМТ'),
+        ]
+        await db.executemany(
+            "INSERT OR IGNORE INTO shops (code, title, position) VALUES (?, ?, ?)",
+            [(code, title, position) for position, (code, title) in enumerate(shops, 1)])
+        try:
+            with open(LEGACY_MACHINES_FILE, 'r', encoding='utf-8') as file:
+                machines_data = json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError) as e:
+            logger.warning(f"Файл {LEGACY_MACHINES_FILE} не перенесён: {e}")
+            machines_data = {}
+        now = datetime.now().strftime(UPDATED_AT_FORMAT)
+        for key, machines in machines_data.items():
+            await db.executemany(
+                "INSERT OR IGNORE INTO machines (shop_id, name, inventory_number, position, created_at) "
+                "SELECT id, ?, ?, ?, ? FROM shops WHERE code = ?",
+                [(machine['name'], machine.get('inventory_number') or '', position, now,
+                  key.removeprefix('maschines_'))
+                 for position, machine in enumerate(machines, 1)])
+        await db.commit()
+        async with db.execute("SELECT COUNT(*) FROM machines") as cursor:
+            count = (await cursor.fetchone())[0]
+    logger.info(f"Станков в таблице machines: {count}")
+
+
+async def _add_task_machine_id(pool: ConnectionPool):
+    # Ссылка записи на станок по id: цех и станок записи сопоставляются по
+    # названию цеха (tasks.shift) и имени станка. Записи о станках, которых
+    # нет в справочнике, остаются с NULL
+    async with pool.writer() as db:
+        await add_column(db, 'tasks', 'machine_id', 'INTEGER REFERENCES machines(id)')
+        await db.commit()
+    await run_in_batches(
+        pool, 'tasks',
+        "UPDATE tasks SET machine_id = ("
+        "SELECT m.id FROM machines m JOIN shops s ON s.id = m.shop_id "
+        "WHERE s.title = tasks.shift AND m.name = tasks.machine "
+        "ORDER BY m.removed_at IS NOT NULL, m.id DESC LIMIT 1) "
+        "WHERE id > :lo AND id <= :hi")
+    async with pool.writer() as db:
+        # Покрывающий индекс для простоя по станкам: станок, период, минуты
+        await db.execute(
+            "CREATE INDEX IF NOT EXISTS idx_tasks_machine_id "
+            "ON tasks(machine_id, end_ts, duration_minutes)")
+        await db.commit()
+
+
+# Миграции схемы по порядку; версия хранится в PRAGMA user_version.
+# Новые изменения схемы добавляются только сюда, с очередным номером.
+MIGRATIONS = [
+    Migration(1, "таблица tasks", _create_tasks),
+    Migration(2, "search_blob и триграммный индекс поиска", _add_search_blob),
+    Migration(3, "ISO-время start_ts/end_ts и индексы", _add_iso_timestamps),
+    Migration(4, "простой в минутах и индекс для отчётов", _add_duration_minutes),
+    Migration(5, "время изменения записи updated_at и индекс", _add_updated_at),
+    Migration(6, "режим auto_vacuum=INCREMENTAL", _enable_incremental_vacuum),
+    Migration(7, "таблица пользователей users и перенос json/access_user.json", _create_users),
+    Migration(8, "таблицы shops/machines и перенос json/machines_data.json", _create_catalog),
+    Migration(9, "ссылка tasks.machine_id на станок и индекс", _add_task_machine_id),
+]
+
+
+async def init_db():
+    """Открывает пул соединений и приводит схему БД к последней версии из MIGRATIONS."""
+    await pool.open()
+    version = await migrate(pool, MIGRATIONS)
+    write_queue.start()
+    logger.info(f"База данных инициализирована (версия схемы {version}).")
 
 
 async def add_data(
@@ -95,22 +800,45 @@ async def add_data(
     duration: str,
     shift: str,
     machine: str,
-    inventory_number: str = None
+    inventory_number: str = None,
+    duration_minutes: int = None,
+    machine_id: int = None
 ):
-    """Добавление новой задачи в БД с расширенными полями."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute('''
+    """Добавление новой задачи в БД с расширенными полями.
+
+    duration_minutes — простой в минутах; если не передан, считается по start_time/end_time.
+    machine_id — id станка из справочника (таблица machines).
+    """
+    start_ts, end_ts = to_iso(start_time), to_iso(end_time)
+    if duration_minutes is None and start_ts and end_ts:
+        delta = datetime.strptime(end_ts, ISO_TIME_FORMAT) - datetime.strptime(start_ts, ISO_TIME_FORMAT)
+        duration_minutes = int(delta.total_seconds() // 60)
+    search_blob = build_search_blob({
+        'date': date, 'workers': workers, 'work_description': work_description,
+        'work_solution': work_solution, 'fault_status': fault_status,
+        'machine': machine, 'inventory_number': inventory_number, 'shift': shift,
+    })
+
+    async def insert(db):
+        cursor = await db.execute('''
             INSERT INTO tasks (
                 user_id, date, workers, work_description, work_solution, fault_status,
-                start_time, end_time, duration, shift, machine, inventory_number
+                start_time, end_time, duration, shift, machine, inventory_number,
+                search_blob, start_ts, end_ts, duration_minutes, updated_at, machine_id
             )
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
         ''', (
             user_id, date, workers, work_description, work_solution, fault_status,
-            start_time, end_time, duration, shift, machine, inventory_number
+            start_time, end_time, duration, shift, machine, inventory_number,
+            search_blob, start_ts, end_ts, duration_minutes,
+            datetime.now().strftime(UPDATED_AT_FORMAT), machine_id
         ))
-        await db.commit()
-    logger.info(f"Задача добавлена для пользователя {user_id}.")
+        await index_task(db, cursor.lastrowid, search_blob)
+        return cursor.lastrowid
+
+    task_id = await write_queue.submit(insert, tasks=True)
+    logger.info(f"Задача {task_id} добавлена для пользователя {user_id}.")
+    return task_id
 
 # async def get_today_history():
 #     """Получение истории задач за последние 24 часа для всех пользователей и форматирование в строку сообщений."""
@@ -155,19 +883,108 @@ async def add_data(
 #     separator = "\n---------------------------------------------\n"
 #     return separator.join(messages)
 
+
+async def _downtime_report(group_sql: str, since: datetime = None, until: datetime = None):
+    """Сумма, среднее и число записей о простое с группировкой group_sql.
+
+    Период задаётся по окончанию работ; запрос читает только индекс idx_tasks_downtime.
+    """
+    conditions = ["duration_minutes IS NOT NULL"]
+    params = []
+    if since is not None:
+        conditions.append("end_ts >= ?")
+        params.append(since.strftime(ISO_TIME_FORMAT))
+    if until is not None:
+        conditions.append("end_ts < ?")
+        params.append(until.strftime(ISO_TIME_FORMAT))
+    query = f"""
+        SELECT {group_sql}, COUNT(*), SUM(duration_minutes), AVG(duration_minutes)
+        FROM tasks INDEXED BY idx_tasks_downtime
+        WHERE {' AND '.join(conditions)}
+        GROUP BY {group_sql}
+        ORDER BY SUM(duration_minutes) DESC
+    """
+    async with pool.reader() as db:
+        async with db.execute(query, params) as cursor:
+            return await cursor.fetchall()
+
+
+async def get_downtime_by_machine(since: datetime = None, until: datetime = None):
+    """Простой по станкам: [(цех, станок, записей, всего минут, среднее), ...].
+
+    Записи группируются по machine_id (индекс idx_tasks_machine_id), цех и имя
+    станка берутся из справочника. Записи без ссылки на станок (его нет в
+    справочнике) группируются по сохранённым в них названиям цеха и станка
+    и складываются со станком справочника, если названия совпали.
+    """
+    conditions = ["duration_minutes IS NOT NULL"]
+    params = {}
+    if since is not None:
+        conditions.append("end_ts >= :since")
+        params['since'] = since.strftime(ISO_TIME_FORMAT)
+    if until is not None:
+        conditions.append("end_ts < :until")
+        params['until'] = until.strftime(ISO_TIME_FORMAT)
+    where = ' AND '.join(conditions)
+    query = f"""
+        SELECT shop, machine, SUM(records), SUM(total), SUM(total) * 1.0 / SUM(records)
+        FROM (
+            SELECT s.title AS shop, m.name AS machine, r.records, r.total
+            FROM (
+                SELECT machine_id, COUNT(*) AS records, SUM(duration_minutes) AS total
+                FROM tasks INDEXED BY idx_tasks_machine_id
+                WHERE machine_id IS NOT NULL AND {where}
+                GROUP BY machine_id
+            ) r
+            JOIN machines m ON m.id = r.machine_id
+            JOIN shops s ON s.id = m.shop_id
+            UNION ALL
+            SELECT shift, machine, COUNT(*), SUM(duration_minutes)
+            FROM tasks INDEXED BY idx_tasks_machine_id
+            WHERE machine_id IS NULL AND {where}
+            GROUP BY shift, machine
+        )
+        GROUP BY shop, machine
+        ORDER BY SUM(total) DESC
+    """
+    async with pool.reader() as db:
+        async with db.execute(query, params) as cursor:
+            return await cursor.fetchall()
+
+
+async def get_downtime_by_shop(since: datetime = None, until: datetime = None):
+    """Простой по цехам: [(цех, записей, всего минут, среднее), ...]."""
+    return await _downtime_report("shift", since, until)
+
+
+async def get_downtime_by_period(period: str = 'week', since: datetime = None, until: datetime = None):
+    """Простой по периодам ('day', 'week', 'month'): [(период, записей, всего минут, среднее), ...]."""
+    if period not in DOWNTIME_PERIODS:
+        raise ValueError(f"Неизвестный период: {period}")
+    return await _downtime_report(DOWNTIME_PERIODS[period], since, until)
+
+
+async def get_history_between(since: datetime, until: datetime = None):
+    """Записи, у которых окончание работ попадает в [since, until), новые сверху.
+
+    Время локальное, как его вводят пользователи; выборка идёт по индексу end_ts.
+    """
+    query = f"SELECT {TASK_COLUMNS_SQL} FROM tasks t WHERE t.end_ts >= ?"
+    params = [since.strftime(ISO_TIME_FORMAT)]
+    if until is not None:
+        query += " AND t.end_ts < ?"
+        params.append(until.strftime(ISO_TIME_FORMAT))
+    query += " ORDER BY t.end_ts DESC"
+    async with pool.reader() as db:
+        async with db.execute(query, params) as cursor:
+            return await cursor.fetchall()
+
+
 async def get_today_history():
     """Получение истории задач за последние 24 часа и форматирование в строку."""
 
-    async with aiosqlite.connect(DB_PATH) as db:
-        cursor = await db.execute('''
-            SELECT id, date, workers, work_description, work_solution, fault_status, start_time, end_time, duration, shift, machine, inventory_number
-            FROM tasks
-            WHERE datetime(substr(end_time, 7, 4) || '-' || substr(end_time, 4, 2) || '-' || substr(end_time, 1, 2) || ' ' || substr(end_time, 12, 5)) 
-                  >= datetime('now', '-1 day')
-            ORDER BY date DESC
-        ''')
-        rows = await cursor.fetchall()
-    
+    rows = await get_history_between(datetime.now() - timedelta(hours=24))
+
     if not rows:
         return "За последние 24 часа записей не найдено."
 
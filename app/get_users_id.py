@@ -1,34 +1,11 @@
 from aiogram import F, Router
-import json
 from aiogram.types import Message
 from aiogram.fsm.context import FSMContext
 import app.keyboards as kb
+from app.access import access, Role
 
 router_users_id = Router()
 
-def load_access_data():
-    """Загружает данные пользователей из JSON-файла."""
-    try:
-        with open('json/access_user.json', "r", encoding="utf-8") as file:
-            return json.load(file)
-    except (FileNotFoundError, json.JSONDecodeError):
-        return {
-            "main_admins": [],
-            "admins": [],
-            "users": []
-        }
-        
-        
-def get_users_role(user_id, data):
-    if user_id in data['main_admins']:
-        return "👑 Главный администратор!"
-    elif user_id in data['admins']:
-        return "🛠 Администратор!"
-    elif user_id in data['users']:
-        return "👥 Пользователь"
-    return None
-
-
 # Функция для получения информации о пользователе
 async def get_user_info(bot, user_id):
     try:
@@ -39,34 +16,32 @@ async def get_user_info(bot, user_id):
         return None, None, user_id  # Возвращаем ID, если не удалось получить информацию
 
 @router_users_id.message(F.text == '👥 Пользователи')
-async def send_user_list(message: Message, bot, state: FSMContext):   
-    data = load_access_data()
+async def send_user_list(message: Message, bot, state: FSMContext, role: Role):
     user_id = message.from_user.id  # Получаем ID пользователя
-    role = get_users_role(user_id, data)
     user_list = {
         "👑 Главный администратор": [],
         "🛠 Администраторы": [],
         "👥 Пользователи": []
     }
 
-    if role == "👑 Главный администратор!":
+    if role == Role.MAIN_ADMIN:
         # Обрабатываем списки пользователей
-        for user_id in data['main_admins']:
+        for user_id in access.members(Role.MAIN_ADMIN):
             first_name, last_name, uid = await get_user_info(bot, user_id)
             name_display = f"{first_name or 'Недоступен'} {last_name or ''}".strip()
-            user_role = get_users_role(uid, data)
+            user_role = access.role(uid)
             user_list["👑 Главный администратор"].append(f"{name_display}, ID: {uid}, Уровень доступа: {user_role}")
 
-        for user_id in data['admins']:
+        for user_id in access.members(Role.ADMIN):
             first_name, last_name, uid = await get_user_info(bot, user_id)
             name_display = f"{first_name or 'Недоступен'} {last_name or ''}".strip()
-            user_role = get_users_role(uid, data)
+            user_role = access.role(uid)
             user_list["🛠 Администраторы"].append(f"{name_display}, ID: {uid}, Уровень доступа: {user_role}")
 
-        for user_id in data['users']:
+        for user_id in access.members(Role.USER):
             first_name, last_name, uid = await get_user_info(bot, user_id)
             name_display = f"{first_name or 'Недоступен'} {last_name or ''}".strip()
-            user_role = get_users_role(uid, data)
+            user_role = access.role(uid)
             user_list["👥 Пользователи"].append(f"{name_display}, ID: {uid}, Уровень доступа: {user_role}")
 
         # Формируем ответ
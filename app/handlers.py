@@ -5,26 +5,34 @@ from aiogram.filters import CommandStart, Command
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.types import Message, CallbackQuery
-from app.keyboards import create_keyboard
 from aiogram.filters.callback_data import CallbackData
 from aiogram_calendar import SimpleCalendar, SimpleCalendarCallback, get_user_locale
 from aiogram.exceptions import TelegramBadRequest
 from app.states import Register
 from app.timing import start_cmd
-from app.data_shops import *
 from typing import List, Callable, Awaitable
 import logging
-from functools import wraps
-import shutil
+import html
 import os
 from dotenv import load_dotenv
 import json
 import app.keyboards as kb
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton, ReplyKeyboardRemove, ReplyKeyboardMarkup, KeyboardButton
 
-from datetime import datetime, timedelta
+from datetime import datetime
 import time
-from app.database import init_db, add_data, get_today_history 
+from app.database import get_today_history, DB_PATH
+from app.backup import (create_backup, list_backups, stage_backup, diff_with_database,
+                        BACKUP_KEEP, BACKUP_DIR, BackupError, uploading)
+from app.backup_store import store
+from app.backup_targets import configured_targets, ship_file, ship_snapshot
+from app.pitr import PITR_ENABLED, plan_restore, restore_to_time, swap_with_timeline
+from app.scheduler import scheduler, IntervalTrigger
+from app.access import access, Role
+from app.middlewares import RoleFilter
+from app.maintenance import load_last_report
+from app.catalog import catalog
+from app.callbacks import ShopCallback, MachineCallback, MachineAction, DateCallback, DateAction
 
 load_dotenv('token.env')  # Загружаем переменные окружения из .env файла
 
@@ -40,12 +48,10 @@ logger = logging.getLogger(__name__)
 # Путь к файлу БД SQLite (замена Google Sheets)
 DB_FILE = 'bot_data.db'
 
-# Путь к файлу, где будут храниться данные (JSON для пользователей и станков остаётся)
-FILE_PATH = 'json/machines_data.json'
-FILE_PATH_ACCESS = 'json/access_user.json'
 SETTINGS_FILE = "json/auto_backup.json"
 
 INTERVAL_NAMES = {
+    "hourly": "раз в час",
     "daily": "раз в день",
     "weekly": "раз в неделю",
     "monthly": "раз в месяц",
@@ -53,12 +59,17 @@ INTERVAL_NAMES = {
 }
 
 INTERVAL_SECONDS = {
+    "hourly": 3600,
     "daily": 24 * 3600,
     "weekly": 7 * 24 * 3600,
     "monthly": 30 * 24 * 3600,
     "off": 0
 }
 
+# Имя задачи автокопирования в планировщике и случайный сдвиг запуска (секунды)
+AUTO_BACKUP_JOB = 'auto_backup'
+AUTO_BACKUP_JITTER = 60
+
 
 def load_auto_backup_settings():
     if not os.path.exists(SETTINGS_FILE):
@@ -86,83 +97,6 @@ def validate_user_id(user_id: str) -> tuple[bool, str]:
         return False, "ID пользователя не может начинаться с нуля. Введите корректный ID."
     return True, ""
 
-# Функция для загрузки данных из JSON файла
-def load_access_data():
-    """Загружает данные пользователей из JSON-файла или создает структуру, если файл пуст/не существует."""
-    try:
-        with open(FILE_PATH_ACCESS, "r", encoding="utf-8") as file:
-            return json.load(file)
-    except (FileNotFoundError, json.JSONDecodeError) as e:
-        logger.warning(
-            f"Файл {FILE_PATH_ACCESS} не найден или поврежден, создаем новый: {e}")
-        return {
-            "main_admins": [],
-            "admins": [],
-            "users": []
-        }
-
-# Функция для сохранения данных в JSON файл
-def save_access_data(data):
-    try:
-        with open(FILE_PATH_ACCESS, 'w', encoding='utf-8') as file:
-            json.dump(data, file, indent=4, ensure_ascii=False)
-        logger.info("Данные о пользователях успешно сохранены.")
-    except (IOError, OSError) as e:
-        logger.error(f"Ошибка при записи в файл {FILE_PATH_ACCESS}: {e}")
-    except json.JSONDecodeError as e:
-        logger.error(f"Ошибка при сериализации данных в JSON: {e}")
-    except Exception as e:
-        logger.error(
-            f"Произошла непредвиденная ошибка при сохранении данных: {e}")
-
-# Функция для загрузки данных из файла
-def load_machines_data():
-    if os.path.exists(FILE_PATH):
-        with open(FILE_PATH, 'r', encoding='utf-8') as file:
-            return json.load(file)
-    else:
-        logger.warning(f"Файл {FILE_PATH} не найден, создаем новый.")
-        return {
-            "maschines_1": [],
-            "maschines_2": [],
-            "maschines_3": [],
-            "maschines_11": [],
-            "maschines_15": [],
-            "maschines_17": [],
-            "maschines_20": [],
-            "maschines_26": [],
-            "maschines_kmt": [],
-        }
-
-# Функция для сохранения данных в файл
-def save_machines_data(data):
-    try:
-        with open(FILE_PATH, 'w', encoding='utf-8') as file:
-            json.dump(data, file, indent=4, ensure_ascii=False)
-        logger.info("Данные о станках успешно сохранены.")
-    except (IOError, OSError) as e:
-        logger.error(f"Ошибка при записи в файл {FILE_PATH}: {e}")
-    except json.JSONDecodeError as e:
-        logger.error(f"Ошибка при сериализации данных в JSON: {e}")
-    except Exception as e:
-        logger.error(
-            f"Произошла непредвиденная ошибка при сохранении данных: {e}")
-
-# функция определения уровня доступа
-def get_user_role(user_id, data):
-    if user_id in data['main_admins']:
-        return "👑 Главный администратор!"
-    elif user_id in data['admins']:
-        return "🛠 Администратор!"
-    elif user_id in data['users']:
-        return "👥 Пользователь"
-    return None
-
-# Загружаем данные при старте
-machines_data = load_machines_data()
-
-
-
 # В app.timing.start_cmd добавьте в конце (после сбора данных):
 # collected_data = {...}  # Соберите данные в dict
 # result = await add_data(collected_data, message.from_user.id)
@@ -175,20 +109,19 @@ machines_data = load_machines_data()
 
 # обработка команды start
 @router.message(CommandStart())
-async def cmd_start(message: Message, state: FSMContext):
+async def cmd_start(message: Message, state: FSMContext, role: Role):
     await state.set_state(Register.main_menu)
     # keyboards = create_keyboards()
     # await state.update_data(keyboards=keyboards)
-    data = load_access_data()
     user_id = message.from_user.id  # Получаем ID пользователя
-    role = get_user_role(user_id, data)
+    role_name = role.title
     # Проверяем, какой роль у пользователя
-    if role is None:
-        role = """⛔ У вас нет доступа. 
+    if role == Role.NONE:
+        role_name = """⛔ У вас нет доступа. 
 ➖ Большинство функций вам будет недоступно ❗
 ➖ Пожалуйста, свяжитесь с администратором для получения прав доступа ❗"""
     # Отправляем сообщение с ролью пользователя
-    await message.answer(f"Привет, {message.from_user.full_name}!\nУровень доступа: {role}",
+    await message.answer(f"Привет, {message.from_user.full_name}!\nУровень доступа: {role_name}",
                          reply_markup=kb.main)
     await message.answer("Перед использованием рекомендуем прочитать описание работы бота в разделе помощь")
     logger.info(
@@ -198,13 +131,9 @@ async def cmd_start(message: Message, state: FSMContext):
 
 
 @router.message(Command('check_access'))
-async def get_access(message: Message):
-    data = load_access_data()
-    user_id = message.from_user.id  # Получаем ID пользователя
-    role = get_user_role(user_id, data)
-    if role is None:
-        role = '⛔ У вас нет доступа'
-    await message.answer(f"Ваш уровень доступа: {role}")
+async def get_access(message: Message, role: Role):
+    role_name = role.title or '⛔ У вас нет доступа'
+    await message.answer(f"Ваш уровень доступа: {role_name}")
 
 
 @router.message(Command('help'))
@@ -231,11 +160,8 @@ async def send_user_id(message: Message):
 
 
 @router.message(Command("url"))
-async def send_url(message: Message):
-    data = load_access_data()
-    user_id = message.from_user.id  # Получаем ID пользователя
-    role = get_user_role(user_id, data)
-    if role in ["👑 Главный администратор!", "🛠 Администратор!"]:
+async def send_url(message: Message, role: Role):
+    if role >= Role.ADMIN:
         # Логика для авторизованных пользователей
         keyboard = InlineKeyboardMarkup(
             inline_keyboard=[[InlineKeyboardButton(
@@ -246,11 +172,8 @@ async def send_url(message: Message):
 
 
 @router.message(F.text == '📜 История за сутки')
-async def history(message: Message):
-    data = load_access_data()
-    user_id = message.from_user.id  # Получаем ID пользователя
-    role = get_user_role(user_id, data)
-    if role in ["👑 Главный администратор!", "🛠 Администратор!", "👥 Пользователь"]:
+async def history(message: Message, role: Role):
+    if role >= Role.USER:
         temp_message = await message.answer( "⏳ Получаю историю за сутки...")
         try:
             await asyncio.sleep(1)
@@ -267,22 +190,16 @@ async def history(message: Message):
 
 
 @router.message(F.text == '🛠️ Редактор')
-async def to_edit(message: Message):
-    data = load_access_data()
-    user_id = message.from_user.id  # Получаем ID пользователя
-    role = get_user_role(user_id, data)
-    if role in ["👑 Главный администратор!", "🛠 Администратор!"]:
+async def to_edit(message: Message, role: Role):
+    if role >= Role.ADMIN:
         await message.answer("Выберите действие (только для администраторов)", reply_markup=kb.edit_mashines)
     else:
         await message.answer('⛔ У вас нет доступа')
 
 
 @router.message(F.text == '👑 Админ меню')
-async def admin_menu(message: Message):
-    data = load_access_data()
-    user_id = message.from_user.id  # Получаем ID пользователя
-    role = get_user_role(user_id, data)
-    if role in ["👑 Главный администратор!"]:
+async def admin_menu(message: Message, role: Role):
+    if role == Role.MAIN_ADMIN:
         await message.answer("Выберите действие (только для администраторов)", reply_markup=kb.admin_menu)
     else:
         await message.answer('⛔ У вас нет доступа')
@@ -317,33 +234,57 @@ async def go_to_main_menu(callback: CallbackQuery, state: FSMContext):
     # Заканчиваем callback
     await callback.answer()
 
-@router.message(F.text == '💾 Резервная копия БД')
+# Фоновые отправки копий: ссылка на задачу живёт здесь, пока задача не завершится
+_upload_tasks = set()
+
+
+def _start_upload(backup_filename: str, targets):
+    """Запускает отправку копии в фоне; пока она идёт, ротация копию не удаляет."""
+    uploading.add(backup_filename)
+    task = asyncio.create_task(ship_file(
+        os.path.join(BACKUP_DIR, backup_filename), f"full/{backup_filename}", targets))
+    _upload_tasks.add(task)
+    task.add_done_callback(_upload_tasks.discard)
+    task.add_done_callback(lambda _: uploading.discard(backup_filename))
+
+
+@router.message(F.text == '💾 Резервная копия БД', RoleFilter(Role.MAIN_ADMIN))
 async def backup_database_handler(message: Message):
     progress_msg = await message.answer("⏳ Создаю резервную копию базы данных...")
 
+    async def show_progress(percent):
+        try:
+            await progress_msg.edit_text(f"⏳ Создаю резервную копию базы данных... {percent}%")
+        except TelegramBadRequest:
+            pass  # Текст не изменился или сообщение уже удалено
+
     try:
-        await asyncio.sleep(1)
+        backup_filename = await create_backup(on_progress=show_progress)
 
-        backup_filename = await create_backup()
+        current_count = len(list_backups())
 
-        backup_dir = 'backup'
-        current_count = len([
-            f for f in os.listdir(backup_dir)
-            if f.startswith('Копия_БД_') and f.endswith('.db')
-        ])
+        # Отправка во внешние хранилища идёт в фоне, обработчик её не ждёт
+        targets = configured_targets()
+        if targets:
+            _start_upload(backup_filename, targets)
 
         await progress_msg.edit_text(
-            f"✅ Резервная копия успешно создана!\n"
+            f"✅ Резервная копия успешно создана и проверена!\n"
             f"Файл: {backup_filename}\n"
-            f"Всего копий: {current_count}/5"
+            f"Всего копий: {current_count}/{BACKUP_KEEP}"
+            + (f"\n📤 Отправляется в хранилища: {', '.join(t.name for t in targets)}" if targets else "")
         )
 
-        logger.info(f"Создана резервная копия: {backup_filename} ({current_count}/5)")
+        logger.info(f"Создана резервная копия: {backup_filename} ({current_count}/{BACKUP_KEEP})")
 
     except FileNotFoundError:
         await progress_msg.edit_text("❌ Ошибка: исходная база данных не найдена!")
         logger.error("Резервная копия: исходная база данных не найдена.")
 
+    except BackupError as e:
+        await progress_msg.edit_text(f"❌ Копия не прошла проверку и удалена: {str(e)}")
+        logger.error(f"Резервная копия повреждена: {e}")
+
     except Exception as e:
         await progress_msg.edit_text(f"❌ Ошибка при создании резервной копии: {str(e)}")
         logger.error(f"Ошибка резервного копирования: {e}")
@@ -359,17 +300,50 @@ confirm_menu = ReplyKeyboardMarkup(
 
 pending_changes = {}
 
+@router.message(F.text == '🧹 Обслуживание БД', RoleFilter(Role.MAIN_ADMIN))
+async def maintenance_report_handler(message: Message):
+    report = load_last_report()
+    if report is None:
+        await message.answer(
+            "Обслуживание БД ещё не выполнялось.", reply_markup=kb.admin_menu)
+        return
+
+    before, after = report['size_before'], report['size_after']
+    integrity = {
+        'ok': "✅ ошибок нет",
+        'timeout': "⏳ не уложилась во время, будет повторена",
+    }.get(report['integrity'], f"❌ {html.escape(report['integrity'])}")
+    timings = "\n".join(
+        f"• {html.escape(name)}: {report['timings_before'][name]} → {ms} мс"
+        for name, ms in report['timings_after'].items())
+    started = datetime.fromisoformat(report['started']).strftime("%d.%m.%Y %H:%M")
+
+    await message.answer(
+        f"🧹 <b>Обслуживание БД</b> {started} ({report['duration']:.1f} с)\n\n"
+        f"Размер: {before['bytes'] // 1024} КБ → {after['bytes'] // 1024} КБ\n"
+        f"Освобождено страниц: {report['freed_pages']} "
+        f"(свободных осталось {after['free_pages']})\n"
+        f"Проверка целостности: {integrity}\n\n"
+        f"Время запросов:\n{timings}",
+        parse_mode="HTML",
+        reply_markup=kb.admin_menu
+    )
+
+
 @router.message(F.text.in_({
+    '⏱ Раз в час',
     '🔁 Раз в день',
     '📅 Раз в неделю',
     '🗓 Раз в месяц',
     '❌ Отключить автокопирование'
-}))
+}), RoleFilter(Role.MAIN_ADMIN))
 async def auto_backup_interval_handler(message: Message):
     settings = load_auto_backup_settings()
 
     # Определяем новый интервал
-    if message.text == '🔁 Раз в день':
+    if message.text == '⏱ Раз в час':
+        new_interval = "hourly"
+    elif message.text == '🔁 Раз в день':
         new_interval = "daily"
     elif message.text == '📅 Раз в неделю':
         new_interval = "weekly"
@@ -401,7 +375,7 @@ async def auto_backup_interval_handler(message: Message):
         parse_mode="Markdown"
     )
 
-@router.message(F.text == '✔ Да')
+@router.message(F.text == '✔ Да', RoleFilter(Role.MAIN_ADMIN))
 async def confirm_auto_backup_change(message: Message):
     user_id = message.from_user.id
 
@@ -416,6 +390,8 @@ async def confirm_auto_backup_change(message: Message):
     settings["enabled"] = (new_interval != "off")
 
     save_auto_backup_settings(settings)
+    # Новый период действует сразу, без перезапуска бота
+    schedule_auto_backup(settings)
 
     await message.answer(
         f"Автокопирование: {INTERVAL_NAMES[new_interval]}.",
@@ -432,88 +408,88 @@ async def cancel_auto_backup_change(message: Message):
     )
 
 
-    
-async def create_backup():
-    source_db = 'bot_data.db'
-    backup_dir = 'backup'
-
-    if not os.path.exists(source_db):
-        raise FileNotFoundError("Исходная база данных не найдена")
-
-    if not os.path.exists(backup_dir):
-        os.makedirs(backup_dir)
+async def auto_backup_job():
+    """Задача планировщика: инкрементальный снимок, отправка и очистка хранилища."""
+    async def log_progress(percent):
+        logger.info(f"Автокопирование: {percent}%")
 
-    # Ротация
-    backup_files = [
-        f for f in os.listdir(backup_dir)
-        if f.startswith('Копия_БД_') and f.endswith('.db')
-    ]
-
-    if len(backup_files) >= 5:
-        backup_files.sort(key=lambda x: os.path.getctime(os.path.join(backup_dir, x)))
-        os.remove(os.path.join(backup_dir, backup_files[0]))
-
-    timestamp = datetime.now().strftime("%d.%m.%Y_%H-%M-%S")
-    backup_filename = f"Копия_БД_{timestamp}.db"
-    backup_path = os.path.join(backup_dir, backup_filename)
+    # Автокопии — инкрементальные снимки: хранятся только изменённые куски
+    manifest = await store.snapshot(on_progress=log_progress)
+    # Снимок уходит с машины: недостающие куски и манифест
+    await ship_snapshot(manifest)
+    await store.gc()
+    settings = load_auto_backup_settings()
+    settings["last_backup"] = time.time()
+    save_auto_backup_settings(settings)
+    logger.info(f"Автокопирование: создан снимок {manifest['id']}")
 
-    shutil.copy2(source_db, backup_path)
 
-    return backup_filename
+def schedule_auto_backup(settings=None):
+    """Ставит, переносит или снимает задачу автокопирования по настройкам.
 
-async def auto_backup_loop():
-    while True:
+    Вызывается при запуске и при смене периода — файл настроек читается
+    только в эти моменты. Следующий запуск отсчитывается от последней копии.
+    """
+    if settings is None:
         settings = load_auto_backup_settings()
+    if not settings["enabled"] or settings["interval"] == "off":
+        scheduler.remove_job(AUTO_BACKUP_JOB)
+        return
 
-        if settings["enabled"]:
-            now = time.time()
-            interval_seconds = INTERVAL_SECONDS[settings["interval"]]
-
-            if now - settings["last_backup"] >= interval_seconds:
-                try:
-                    filename = await create_backup()
-                    settings["last_backup"] = now
-                    save_auto_backup_settings(settings)
-                    logger.info(f"Автокопирование: создана копия {filename}")
-                except Exception as e:
-                    logger.error(f"Ошибка автокопирования: {e}")
-
-        await asyncio.sleep(10)
+    interval_seconds = INTERVAL_SECONDS[settings["interval"]]
+    next_run = max(datetime.now(), datetime.fromtimestamp(settings["last_backup"] + interval_seconds))
+    if AUTO_BACKUP_JOB in scheduler.jobs:
+        scheduler.reschedule(AUTO_BACKUP_JOB, IntervalTrigger(interval_seconds), next_run=next_run)
+    else:
+        scheduler.add_job(AUTO_BACKUP_JOB, auto_backup_job, IntervalTrigger(interval_seconds),
+                          jitter=AUTO_BACKUP_JITTER, first_run=next_run)
 
 
 
 # Глобальное хранилище для отслеживания состояния восстановления
 restore_states = {}
 
-@router.message(F.text == '🔄 Восстановить БД из копии')
+
+def list_restore_points(limit=10):
+    """Полные копии и инкрементальные снимки для меню восстановления, новые первыми."""
+    points = [
+        {'kind': 'file', 'name': f,
+         'time': datetime.fromtimestamp(os.path.getctime(os.path.join(BACKUP_DIR, f)))}
+        for f in list_backups()
+    ]
+    points += [
+        {'kind': 'snapshot', 'name': m['id'], 'time': datetime.fromisoformat(m['created'])}
+        for m in store.list_snapshots()
+    ]
+    points.sort(key=lambda p: p['time'], reverse=True)
+    return points[:limit]
+
+
+@router.message(F.text == '🔄 Восстановить БД из копии', RoleFilter(Role.MAIN_ADMIN))
 async def restore_database_handler(message: Message):
     try:
-        backup_dir = 'backup'
-        
-        if not os.path.exists(backup_dir):
-            await message.answer("❌ Папка с резервными копиями не найдена!")
-            return
+        restore_points = list_restore_points()
         
-        backup_files = [f for f in os.listdir(backup_dir) if f.startswith('Копия_БД_') and f.endswith('.db')]
-        backup_files.sort(key=lambda x: os.path.getctime(os.path.join(backup_dir, x)), reverse=True)
-        
-        if not backup_files:
+        if not restore_points and not PITR_ENABLED:
             await message.answer("❌ Резервные копии не найдены!")
             return
         
         # Создаем inline клавиатуру с выбором копий
         keyboard = []
-        for i, filename in enumerate(backup_files[:5], 1):
-            file_time = datetime.fromtimestamp(os.path.getctime(os.path.join(backup_dir, filename))).strftime("%d.%m.%Y %H:%M")
-            button_text = f"{i}. {file_time}"
+        for i, point in enumerate(restore_points, 1):
+            file_time = point['time'].strftime("%d.%m.%Y %H:%M")
+            kind_icon = "🧩" if point['kind'] == 'snapshot' else "📄"
+            button_text = f"{i}. {kind_icon} {file_time}"
             callback_data = f"select_restore_{i}"
             keyboard.append([InlineKeyboardButton(text=button_text, callback_data=callback_data)])
         
+        if PITR_ENABLED:
+            keyboard.append([InlineKeyboardButton(text="🕰 На момент времени", callback_data="restore_to_time")])
         keyboard.append([InlineKeyboardButton(text="❌ Отмена", callback_data="restore_cancel")])
         
-        # Сохраняем список файлов для текущего пользователя
+        # Сохраняем список копий для текущего пользователя
         restore_states[message.from_user.id] = {
-            'files': backup_files[:5],
+            'files': restore_points,
             'step': 'select_backup'
         }
         
@@ -523,8 +499,39 @@ async def restore_database_handler(message: Message):
     except Exception as e:
         await message.answer(f"❌ Ошибка: {str(e)}")
 
+async def describe_restore_diff(restore_point: dict) -> str:
+    """Текст для подтверждения: что изменится в tasks после восстановления из копии."""
+    preview_path = None
+    try:
+        if restore_point['kind'] == 'snapshot':
+            preview_path = os.path.join(BACKUP_DIR, f"preview_{restore_point['name']}.db")
+            await store.restore(restore_point['name'], preview_path)
+            backup_path = preview_path
+        else:
+            backup_path = os.path.join(BACKUP_DIR, restore_point['name'])
+        summary = await diff_with_database(backup_path)
+    except Exception as e:
+        logger.error(f"Не удалось сравнить копию с текущей БД: {e}")
+        return "📊 Сравнить копию с текущей базой не удалось.\n"
+    finally:
+        if preview_path and os.path.exists(preview_path):
+            os.remove(preview_path)
+
+    if not (summary['removed'] or summary['restored'] or summary['changed']):
+        return "📊 Записи в копии совпадают с текущей базой.\n"
+    lines = [
+        "📊 <b>После восстановления:</b>",
+        f"➖ пропадут новые записи: {summary['removed']}",
+        f"➕ вернутся удалённые записи: {summary['restored']}",
+        f"✏️ откатятся изменённые записи: {summary['changed']}",
+    ]
+    for shop, counts in sorted(summary['by_shop'].items()):
+        lines.append(f"• {html.escape(shop)}: −{counts['removed']} / +{counts['restored']} / ✏️{counts['changed']}")
+    return "\n".join(lines) + "\n"
+
+
 # Обработчик выбора резервной копии
-@router.callback_query(F.data.startswith('select_restore_'))
+@router.callback_query(F.data.startswith('select_restore_'), RoleFilter(Role.MAIN_ADMIN))
 async def select_backup_handler(callback: CallbackQuery):
     try:
         user_id = callback.from_user.id
@@ -543,7 +550,11 @@ async def select_backup_handler(callback: CallbackQuery):
             'step': 'confirm_restore'
         })
         
-        file_time = datetime.fromtimestamp(os.path.getctime(os.path.join('backup', selected_file))).strftime("%d.%m.%Y %H:%M")
+        file_time = selected_file['time'].strftime("%d.%m.%Y %H:%M")
+        if selected_file['kind'] == 'snapshot':
+            source_name = f"снимок {selected_file['name']} (инкрементальный)"
+        else:
+            source_name = selected_file['name']
         
         # Создаем клавиатуру подтверждения
         confirm_keyboard = [
@@ -553,14 +564,19 @@ async def select_backup_handler(callback: CallbackQuery):
         
         markup = InlineKeyboardMarkup(inline_keyboard=confirm_keyboard)
         
+        # Сводка различий копии и текущей базы
+        diff_text = await describe_restore_diff(selected_file)
+        
         await callback.message.edit_text(
             f"⚠️ ВНИМАНИЕ!\n\n"
             f"Вы собираетесь восстановить базу данных из копии:\n"
-            f"📄 {selected_file}\n"
+            f"📄 {html.escape(source_name)}\n"
             f"📅 {file_time}\n\n"
+            f"{diff_text}\n"
             f"Текущие данные будут заменены. Это действие нельзя отменить!\n\n"
             f"Подтвердите восстановление:",
-            reply_markup=markup
+            reply_markup=markup,
+            parse_mode="HTML"
         )
         await callback.answer()
         
@@ -568,7 +584,7 @@ async def select_backup_handler(callback: CallbackQuery):
         await callback.answer(f"❌ Ошибка: {str(e)}", show_alert=True)
 
 # Обработчик подтверждения восстановления
-@router.callback_query(F.data == 'confirm_restore')
+@router.callback_query(F.data == 'confirm_restore', RoleFilter(Role.MAIN_ADMIN))
 async def confirm_restore_handler(callback: CallbackQuery):
     try:
         user_id = callback.from_user.id
@@ -580,11 +596,13 @@ async def confirm_restore_handler(callback: CallbackQuery):
         selected_file = restore_states[user_id]['selected_file']
         
         # Выполняем восстановление
-        result = await perform_database_restore(selected_file)
+        pause = await perform_database_restore(selected_file)
         
-        if result:
-            await callback.message.edit_text("✅ База данных успешно восстановлена из резервной копии!")
-            # Перезапуск бота может потребоваться в зависимости от архитектуры
+        if pause is not None:
+            await callback.message.edit_text(
+                f"✅ База данных успешно восстановлена из резервной копии!\n"
+                f"⏱ Запись была приостановлена на {pause * 1000:.0f} мс."
+            )
         else:
             await callback.message.edit_text("❌ Ошибка при восстановлении базы данных!")
         
@@ -597,40 +615,106 @@ async def confirm_restore_handler(callback: CallbackQuery):
     except Exception as e:
         await callback.answer(f"❌ Ошибка: {str(e)}", show_alert=True)
 
+# Восстановление на момент времени (режим PITR): запрос даты и времени
+@router.callback_query(F.data == 'restore_to_time', RoleFilter(Role.MAIN_ADMIN))
+async def restore_to_time_handler(callback: CallbackQuery, state: FSMContext):
+    restore_states[callback.from_user.id] = {'step': 'enter_time'}
+    await callback.message.edit_text(
+        "🕰 Введите дату и время, на которые восстановить базу,\n"
+        "в формате <code>дд.мм.гггг чч:мм</code>:",
+        parse_mode="HTML"
+    )
+    await state.set_state(Register.restore_time)
+    await callback.answer()
+
+
+@router.message(Register.restore_time)
+async def restore_time_input_handler(message: Message, state: FSMContext):
+    user_id = message.from_user.id
+    try:
+        target = datetime.strptime(message.text.strip(), '%d.%m.%Y %H:%M')
+    except ValueError:
+        await message.answer("Неверный формат. Пример: 18.10.2026 14:30")
+        return
+    await state.clear()
+
+    plan = plan_restore(target)
+    if plan is None:
+        restore_states.pop(user_id, None)
+        await message.answer("❌ Нет базового снимка раньше этого времени.", reply_markup=kb.admin_menu)
+        return
+
+    restore_states[user_id] = {'step': 'confirm_pitr', 'target': target}
+    markup = InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="✅ Подтвердить", callback_data="confirm_pitr")],
+        [InlineKeyboardButton(text="❌ Отмена", callback_data="restore_cancel")]
+    ])
+    base_time = datetime.fromisoformat(plan['base']['created']).strftime("%d.%m.%Y %H:%M:%S")
+    await message.answer(
+        f"⚠️ ВНИМАНИЕ!\n\n"
+        f"База будет восстановлена на {plan['restored_to'].strftime('%d.%m.%Y %H:%M:%S')}\n"
+        f"(снимок {base_time} + сегментов журнала: {len(plan['segments'])}).\n\n"
+        f"Все изменения после этого момента будут отменены. Подтвердите восстановление:",
+        reply_markup=markup
+    )
+
+
+@router.callback_query(F.data == 'confirm_pitr', RoleFilter(Role.MAIN_ADMIN))
+async def confirm_pitr_handler(callback: CallbackQuery):
+    user_id = callback.from_user.id
+    if user_id not in restore_states or restore_states[user_id]['step'] != 'confirm_pitr':
+        await callback.answer("❌ Сессия истекла, начните заново", show_alert=True)
+        return
+
+    target = restore_states.pop(user_id)['target']
+    await callback.message.edit_text("⏳ Восстанавливаю базу на выбранный момент...")
+    try:
+        pause, restored_to = await restore_to_time(target)
+        await callback.message.edit_text(
+            f"✅ База восстановлена на {restored_to.strftime('%d.%m.%Y %H:%M:%S')}.\n"
+            f"⏱ Запись была приостановлена на {pause * 1000:.0f} мс."
+        )
+    except Exception as e:
+        logger.error(f"Ошибка восстановления на момент времени: {e}")
+        await callback.message.edit_text(f"❌ Ошибка при восстановлении: {str(e)}")
+    await callback.answer()
+
+
 # Обработчик отмены
 @router.callback_query(F.data == 'restore_cancel')
-async def cancel_restore_handler(callback: CallbackQuery):
+async def cancel_restore_handler(callback: CallbackQuery, state: FSMContext):
     user_id = callback.from_user.id
     
     if user_id in restore_states:
         del restore_states[user_id]
+    await state.clear()
     
     await callback.message.edit_text("↩️ Восстановление отменено.")
     await callback.answer()
 
-# Функция выполнения восстановления
-async def perform_database_restore(backup_filename: str) -> bool:
+# Функция выполнения восстановления: возвращает длительность паузы записи (сек) или None
+async def perform_database_restore(restore_point: dict):
     try:
-        main_db_path = 'bot_data.db'
-        backup_path = f'backup/{backup_filename}'
-        
-        # Проверяем существование файла резервной копии
-        if not os.path.exists(backup_path):
-            return False
-        
-        # Закрываем все соединения с БД (если используется)
-        # await close_all_db_connections()  # Реализуйте эту функцию если нужно
-        
-        # Восстанавливаем из выбранной копии
-        shutil.copy2(backup_path, main_db_path)
-        
-        return True
+        if restore_point['kind'] == 'snapshot':
+            # Снимок собирается из кусков хранилища сразу во временный файл рядом с БД
+            staging_path = DB_PATH + '.restore'
+            await store.restore(restore_point['name'], staging_path)
+        else:
+            backup_path = os.path.join(BACKUP_DIR, restore_point['name'])
+            # Проверяем существование файла резервной копии
+            if not os.path.exists(backup_path):
+                return None
+            staging_path = await stage_backup(backup_path)
+
+        # Подмена файла с короткой паузой запросов к БД; в режиме PITR текущий WAL
+        # сначала уходит в архив, а после подмены начинается новая цепочка
+        return await swap_with_timeline(staging_path)
     except Exception as e:
         logger.error(f"Ошибка восстановления БД: {e}")
-        return False
+        return None
 
 
-@router.message(F.text == '🕒 Автокопирование БД')
+@router.message(F.text == '🕒 Автокопирование БД', RoleFilter(Role.MAIN_ADMIN))
 async def auto_backup_settings(message: Message):
     settings = load_auto_backup_settings()
     interval = settings["interval"]
@@ -638,6 +722,7 @@ async def auto_backup_settings(message: Message):
     # Красивые статусы
     status_icon = "🟢" if settings["enabled"] else "🔴"
     interval_icon = {
+        "hourly": "⏱",
         "daily": "🔁",
         "weekly": "📅",
         "monthly": "🗓",
@@ -668,12 +753,9 @@ async def auto_backup_back_handler(message: Message):
 
 
 @router.message(F.text == '📚 Руководства')
-async def manuals(message: Message):
-    data = load_access_data()
-    user_id = message.from_user.id
-    role = get_user_role(user_id, data)
+async def manuals(message: Message, role: Role):
 
-    if role in ["👑 Главный администратор!", "🛠 Администратор!", "👥 Пользователь"]:
+    if role >= Role.USER:
         text = (
     			"Выберите руководство:\n\n"
     			f"📄 <a href=\"{MD}\">Параметры MD</a>\n"
@@ -700,12 +782,9 @@ async def manuals(message: Message):
 
 
 @router.callback_query(F.data == 'error_calculator')
-async def start_error_calculator(callback: CallbackQuery, state: FSMContext):
-    data = load_access_data()
-    user_id = callback.from_user.id
-    role = get_user_role(user_id, data)
+async def start_error_calculator(callback: CallbackQuery, state: FSMContext, role: Role):
 
-    if role in ["👑 Главный администратор!", "🛠 Администратор!", "👥 Пользователь"]:
+    if role >= Role.USER:
         await callback.answer()
 
         # Пытаемся удалить сообщение с кнопками руководств
@@ -770,13 +849,10 @@ async def cmd_clear_no(message: Message, state: FSMContext):
 
 
 @router.message(F.text == '📝 Добавить запись')
-async def add_record(message: Message, state: FSMContext):
-    data = load_access_data()
-    user_id = message.from_user.id  # Получаем ID пользователя
-    role = get_user_role(user_id, data)
-    if role in ["👑 Главный администратор!", "🛠 Администратор!", "👥 Пользователь"]:
+async def add_record(message: Message, state: FSMContext, role: Role):
+    if role >= Role.USER:
         await state.set_state(Register.shop_selection)
-        await message.answer('Выберите цех', reply_markup=kb.workshops)
+        await message.answer('Выберите цех', reply_markup=kb.shop_keyboards.workshops())
     else:
         await message.answer('⛔ У вас нет доступа')
 
@@ -784,20 +860,20 @@ async def add_record(message: Message, state: FSMContext):
 # привязка к 2 кнопке назад
 @router.callback_query(F.data == 'back_2')
 async def shops_back_2(callback: CallbackQuery, state: FSMContext):
-    await callback.message.edit_text('Выберите цех', reply_markup=kb.workshops)
+    await callback.message.edit_text('Выберите цех', reply_markup=kb.shop_keyboards.workshops())
     await state.set_state(Register.shop_selection)
 
 
 @router.message(F.text == '✅ Добавить станок')
 async def add_maschine_name(message: Message, state: FSMContext):
     await state.set_state(Register.awaiting_machine_name)
-    await message.answer('Выберите цех', reply_markup=kb.workshops)
+    await message.answer('Выберите цех', reply_markup=kb.shop_keyboards.workshops())
 
 
 @router.message(F.text == '❌ Удалить станок')
 async def remove_maschine_name(message: Message, state: FSMContext):
     await state.set_state(Register.delete_machine)
-    await message.answer('Выберите цех', reply_markup=kb.workshops)
+    await message.answer('Выберите цех', reply_markup=kb.shop_keyboards.workshops())
 
 
 @router.message(F.text == '✅ Доб.пользователя')
@@ -814,19 +890,13 @@ async def get_machine_name(message: Message, state: FSMContext):
         await message.answer(error_msg)
         return
 
-    # Загружаем текущие данные из JSON
-    access_data = load_access_data()
     user_id_int = int(user_id)  # Преобразуем ID к числу
-    # Приводим все ID к int
-    # Проверяем, есть ли ID в администраторах
-    existing_main_admins = set(map(int, access_data.get("main_admins", [])))
-    existing_admins = set(map(int, access_data.get("admins", [])))
-    existing_users = set(map(int, access_data.get("users", [])))
+    level = access.level(user_id_int)
 
-    if user_id_int in existing_main_admins or user_id_int in existing_admins:
+    if level >= Role.ADMIN:
         await message.answer(f"Этот пользователь уже является администратором и не требует добавления в список пользователей.")
         return
-    if user_id_int in existing_users:
+    if level == Role.USER:
         await message.answer(f"Пользователь с ID {user_id} уже существует в списке пользователей.")
         return
 
@@ -838,13 +908,11 @@ async def get_machine_name(message: Message, state: FSMContext):
 async def confirm_yes_users(callback: CallbackQuery, state: FSMContext):
     user_data = await state.get_data()
     user_id = user_data.get('users_id')
-    # Загружаем текущие данные из JSON
-    access_data = load_access_data()
-    # Добавляем новый ID в список пользователей
-    # Приводим к int, если это необходимо
-    access_data['users'].append(int(user_id))
-    # Сохраняем обновленные данные обратно в файл
-    save_access_data(access_data)
+    # Добавляем пользователя; если его успели добавить с другой ролью, ничего не меняется
+    if not await access.grant(int(user_id), Role.USER):
+        await callback.message.edit_text(f"Пользователь с ID {user_id} уже есть в списках доступа.")
+        await state.clear()
+        return
     logger.info(
         f"Пользователь {user_id} добавлен в список пользователей администратором {callback.from_user.id}.")
     await callback.message.edit_text(f"Пользователь с ID {user_id} успешно добавлен в список пользователей!")
@@ -860,11 +928,8 @@ async def confirm_no_users(callback: CallbackQuery, state: FSMContext):
 
 
 @router.message(F.text == '✅ Добавить админа')
-async def add_admins(message: Message, state: FSMContext):
-    data = load_access_data()
-    user_id = message.from_user.id  # Получаем ID пользователя
-    role = get_user_role(user_id, data)
-    if role in ["👑 Главный администратор!"]:
+async def add_admins(message: Message, state: FSMContext, role: Role):
+    if role == Role.MAIN_ADMIN:
         await state.set_state(Register.add_admins)
         await message.answer("Введите ID администратора")
     else:
@@ -879,18 +944,12 @@ async def add_admins_id(message: Message, state: FSMContext):
         await message.answer(error_msg)
         return
 
-    # Загружаем текущие данные из JSON
-    access_data = load_access_data()
     user_id_int = int(user_id)  # Преобразуем ID к числу
-    # Приводим все ID к int
-    # Проверяем, есть ли ID в администраторах
-    existing_main_admins = set(map(int, access_data.get("main_admins", [])))
-    existing_admins = set(map(int, access_data.get("admins", [])))
-    existing_users = set(map(int, access_data.get("users", [])))
-    if user_id_int in existing_main_admins:
+    level = access.level(user_id_int)
+    if level == Role.MAIN_ADMIN:
         await message.answer(f"Этот пользователь уже является главным администратором и не требует добавления в список администраторов.")
         return
-    if user_id_int in existing_admins:
+    if level == Role.ADMIN:
         await message.answer(f"Пользователь с ID {user_id} уже существует в списке администраторов.")
         return
 
@@ -902,13 +961,13 @@ async def add_admins_id(message: Message, state: FSMContext):
 async def confirm_yes_users(callback: CallbackQuery, state: FSMContext):
     user_data = await state.get_data()
     user_id = user_data.get('admins_id')
-    access_data = load_access_data()
-    access_data['admins'].append(int(user_id))
-    if int(user_id) in access_data['users']:
-        access_data['users'].remove(int(user_id))
+    # Новый пользователь или повышение обычного; главного администратора не понижаем
+    if not await access.grant(int(user_id), Role.ADMIN, replace=(Role.USER,)):
+        await callback.message.edit_text(f"Пользователь с ID {user_id} уже является администратором.")
+        await state.clear()
+        return
     logger.info(
         f"Пользователь {callback.from_user.id} успешно добавил {user_id}.")
-    save_access_data(access_data)
     await callback.message.edit_text(f"Пользователь с ID {user_id} успешно добавлен в список администраторов!")
     await state.clear()  # Завершение состояния после успешного добавления
     await state.set_state(Register.main_menu)
@@ -921,27 +980,19 @@ async def confirm_no_users(callback: CallbackQuery, state: FSMContext):
     await callback.message.answer("Выберите действие", reply_markup=kb.edit_mashines)
 
 
-def delete_user_from_access(user_id):
-    """Удаляет пользователя по ID, если он есть в списке, и обновляет JSON-файл."""
-    access_data = load_access_data()
-    if user_id in access_data["users"]:
-        access_data["users"].remove(user_id)
-        try:
-            save_access_data(access_data)
-            logger.info(
-                f"Пользователь {user_id} удален из списка пользователей")
-            return True
-        except Exception as e:
-            logger.error(f"Ошибка удаления пользователя {user_id}: {e}")
-            return False
+async def delete_user_from_access(user_id):
+    """Удаляет пользователя по ID, если у него роль пользователя."""
+    if await access.revoke(user_id, Role.USER):
+        logger.info(
+            f"Пользователь {user_id} удален из списка пользователей")
+        return True
     logger.warning(f"Попытка удалить несуществующего пользователя {user_id}.")
     return False
 
 
 def generate_users_keyboard():
     """Создает клавиатуру с ID пользователей."""
-    access_data = load_access_data()
-    users = access_data.get("users", [])
+    users = access.members(Role.USER)
     if not users:
         logger.info("Список пользователей пуст; клавиатура не создана.")
         return None  # Если список пуст, клавиатуру не создаем
@@ -958,19 +1009,12 @@ def generate_users_keyboard():
     return keyboard
 
 
-def delete_admins_from_access(user_id):
-    """Удаляет пользователя по ID, если он есть в списке, и обновляет JSON-файл."""
-    access_data = load_access_data()
-    if user_id in access_data["admins"]:
-        access_data["admins"].remove(user_id)  # Удаляем ID
-        try:
-            save_access_data(access_data)  # Сохраняем обновленный файл
-            logger.info(
-                f"Администратор {user_id} удален из списка администраторов.")
-            return True  # Успешное удаление
-        except Exception as e:
-            logger.error(f"Ошибка при удалении администратора {user_id}: {e}")
-            return False
+async def delete_admins_from_access(user_id):
+    """Удаляет пользователя по ID, если у него роль администратора."""
+    if await access.revoke(user_id, Role.ADMIN):
+        logger.info(
+            f"Администратор {user_id} удален из списка администраторов.")
+        return True  # Успешное удаление
     logger.warning(
         f"Попытка удалить несуществующего администратора {user_id}.")
     return False
@@ -978,8 +1022,7 @@ def delete_admins_from_access(user_id):
 
 def generate_admins_keyboard():
     """Создает клавиатуру с ID пользователей."""
-    access_data = load_access_data()
-    admins = access_data.get("admins", [])
+    admins = access.members(Role.ADMIN)
 
     if not admins:
         logger.info("Список администраторов пуст; клавиатура не создана.")
@@ -999,11 +1042,8 @@ def generate_admins_keyboard():
 
 
 @router.message(F.text == '❌ Удалить админа')
-async def show_admins_to_delete(message: Message, state: FSMContext):
-    data = load_access_data()
-    user_id = message.from_user.id  # Получаем ID пользователя
-    role = get_user_role(user_id, data)
-    if role in ["👑 Главный администратор!"]:
+async def show_admins_to_delete(message: Message, state: FSMContext, role: Role):
+    if role == Role.MAIN_ADMIN:
         keyboard = generate_admins_keyboard()
         if keyboard:
             await message.answer("Выберите пользователя для удаления:", reply_markup=keyboard)
@@ -1026,7 +1066,7 @@ async def confirm_delete_admins_1(callback: CallbackQuery, state: FSMContext):
     """Удаляет пользователя после подтверждения."""
     user_data = await state.get_data()
     user_id = user_data.get('admins_id_access')
-    if delete_admins_from_access(user_id):
+    if await delete_admins_from_access(user_id):
         logger.info(
             f"Пользователь {callback.from_user.id} подтвердил удаление администратора {user_id}.")
         await callback.message.edit_text(f"✅ Пользователь с ID {user_id} удален!")
@@ -1071,7 +1111,7 @@ async def confirm_delete_user_1(callback: CallbackQuery, state: FSMContext):
     """Удаляет пользователя после подтверждения."""
     user_data = await state.get_data()
     user_id = user_data.get('user_id_access')
-    if delete_user_from_access(user_id):
+    if await delete_user_from_access(user_id):
         logger.info(
             f"Пользователь {callback.from_user.id} подтвердил удаление пользователя {user_id}.")
         await callback.message.edit_text(f"✅ Пользователь с ID {user_id} удален!")
@@ -1090,22 +1130,19 @@ async def cancel_delete_users(callback: CallbackQuery):
 
 
 # функция формирования кнопок из файла json в зависимости от состояния
-@router.callback_query(F.data.regexp(r'(.+?)-shop'))
-async def shops(callback: CallbackQuery, state: FSMContext):
-    # Извлекаем номер цеха из данных колбэка
-    # Получаем номер или название цеха
-    shop_number = callback.data.split('-')[0]
-    machines_data = load_machines_data()
-    machines = machines_data.get(f'maschines_{shop_number}', [])
-    # Обновляем состояние пользователя
-    await state.update_data(selected_shop=callback.data)
+@router.callback_query(ShopCallback.filter())
+async def shops(callback: CallbackQuery, callback_data: ShopCallback, state: FSMContext):
+    # Номер или название цеха
+    shop_number = callback_data.shop
+    # Обновляем состояние пользователя ('1-shop': код цеха до дефиса)
+    await state.update_data(selected_shop=f'{shop_number}-shop')
     logger.info(
         f"Пользователь {callback.from_user.id} выбрал цех {shop_number}.")
     if await state.get_state() == Register.shop_selection.state:
         # Устанавливаем состояние в зависимости от номера цеха
         await state.set_state(getattr(Register, f'machine_selection_{shop_number}'))
         # Генерируем клавиатуру с станками
-        keyboard = create_keyboard(machines)
+        keyboard = kb.shop_keyboards.get(shop_number)
         await callback.message.edit_text('Выберите станок', reply_markup=keyboard)
     elif await state.get_state() == Register.awaiting_machine_name.state:
         await callback.message.edit_text("Введите название станка")
@@ -1113,7 +1150,7 @@ async def shops(callback: CallbackQuery, state: FSMContext):
     elif await state.get_state() == Register.delete_machine.state:
         # Устанавливаем состояние в зависимости от номера цеха
         await state.set_state(getattr(Register, f'machine_selection_{shop_number}'))
-        keyboard = create_keyboard(machines)
+        keyboard = kb.shop_keyboards.get(shop_number, MachineAction.delete)
         await callback.message.edit_text('Выберите станок для удаления', reply_markup=keyboard)
         await state.set_state(Register.delete_machine_1)
 
@@ -1133,11 +1170,8 @@ async def get_machine_name(message: Message, state: FSMContext):
     user_data = await state.get_data()
     shop = user_data.get('selected_shop')
     shop_number = shop.split('-')[0]
-    # Загружаем данные о станках из файла
-    machines_data = load_machines_data()
     # Проверка, есть ли уже станок с таким именем в выбранном цехе
-    existing_machines = machines_data.get(f'maschines_{shop_number}', [])
-    if any(machine['name'].lower() == machine_name.lower() for machine in existing_machines):
+    if catalog.find(shop_number, machine_name):
         logger.warning(
             f"Пользователь {message.from_user.id} ввел дублирующее название станка '{machine_name}' в цехе {shop_number}.")
         await message.answer(f"Станок с таким названием уже существует в цехе {shop_number}. Пожалуйста, введите другое название.")
@@ -1159,11 +1193,8 @@ async def add_machine_inventory(message: Message, state: FSMContext):
     machine_name = user_data.get("machine_name")
     shop = user_data.get('selected_shop')
     shop_number = shop.split('-')[0]
-    # Загружаем данные о станках из файла
-    machines_data = load_machines_data()
     # Проверка, есть ли уже станок с таким инвентарным номером в выбранном цехе
-    existing_machines = machines_data.get(f'maschines_{shop_number}', [])
-    if any(machine['inventory_number'] == inventory_number for machine in existing_machines):
+    if any(machine['inventory_number'] == inventory_number for machine in catalog.machines(shop_number)):
         logger.warning(
             f"Пользователь {message.from_user.id} ввел дублирующий инвентарный номер '{inventory_number}' в цехе {shop_number}.")
         await message.answer(f"Станок с таким инвентарным номером уже существует в цехе {shop_number}. Пожалуйста, введите другой номер.")
@@ -1187,22 +1218,22 @@ async def confirm_yes(callback: CallbackQuery, state: FSMContext):
     user_data = await state.get_data()
     new_machine = user_data.get("new_machine")
     shop_number = user_data.get("shop_number")
-    machines_data = load_machines_data()
     # Проверка, существует ли уже станок с таким именем или инвентарным номером
-    existing_machines = machines_data.get(f'maschines_{shop_number}', [])
-    if any(machine['name'].lower() == new_machine['name'].lower() or
-           machine['inventory_number'] == new_machine['inventory_number']
-           for machine in existing_machines):
+    if catalog.find(shop_number, new_machine['name']) or any(
+            machine['inventory_number'] == new_machine['inventory_number']
+            for machine in catalog.machines(shop_number)):
         logger.warning(
             f"Пользователь {callback.from_user.id} подтвердил добавление дублирующего станка в цехе {shop_number}.")
         await callback.message.answer(f"Станок с таким названием или инвентарным номером уже существует в цехе {shop_number}.")
         return
 
     # Добавляем станок в соответствующий цех
-    machines_data[f'maschines_{shop_number}'].append(new_machine)
-    # Сохраняем обновленные данные в файл
     try:
-        save_machines_data(machines_data)
+        added = await catalog.add_machine(shop_number, new_machine['name'], new_machine['inventory_number'])
+        if added is None:
+            # Станок с таким именем успел добавить другой пользователь
+            await callback.message.answer(f"Станок с таким названием уже существует в цехе {shop_number}.")
+            return
         logger.info(
             f"Пользователь {callback.from_user.id} добавил станок '{new_machine['name']}' в цех {shop_number}.")
         # Подтверждение добавления станка
@@ -1227,28 +1258,24 @@ async def confirm_no(callback: CallbackQuery, state: FSMContext):
 
 
 # функция для работы после выбора станка в зависимости от состояния
-@router.callback_query(lambda callback: any(machine['name'] in callback.data for machines in load_machines_data().values() for machine in machines))
-async def reg(callback: CallbackQuery, state: FSMContext):
-    await state.update_data(selected_machine=callback.data)
-    if await state.get_state() == Register.delete_machine_1.state:
-        user_data = await state.get_data()
-        shop_number = user_data.get('selected_shop').split('-')[0]
-        machine_name = user_data.get('selected_machine')  # Получаем имя станка
-        machines_data = load_machines_data()
-        machines = machines_data.get(f'maschines_{shop_number}', [])
-        machine_to_remove = next(
-            (machine for machine in machines if machine['name'] == machine_name), None)
-        if machine_to_remove:
-            # Показываем пользователю кнопки подтверждения
-            await callback.message.edit_text(
-                f"Вы уверены, что хотите удалить станок {machine_name}?",
-                reply_markup=kb.del_machines)
-            # Сохраняем станок для удаления в состояние
-            await state.update_data(machine_to_remove=machine_to_remove)
-        else:
-            logger.warning(
-                f"Пользователь {callback.from_user.id} выбрал несуществующий станок '{machine_name}' в цехе {shop_number}.")
-            await callback.answer("Станок не найден.")
+@router.callback_query(MachineCallback.filter())
+async def reg(callback: CallbackQuery, callback_data: MachineCallback, state: FSMContext):
+    machine = catalog.machine(callback_data.machine)
+    if machine is None or machine['shop'] != callback_data.shop:
+        # Кнопка со станком, удалённым после показа клавиатуры
+        logger.warning(
+            f"Пользователь {callback.from_user.id} нажал кнопку неизвестного станка '{callback.data}'.")
+        await callback.answer("Станок не найден.")
+        return
+    await state.update_data(selected_machine=machine['name'], selected_machine_id=machine['id'])
+    if callback_data.action == MachineAction.delete:
+        machine_to_remove = machine
+        # Показываем пользователю кнопки подтверждения
+        await callback.message.edit_text(
+            f"Вы уверены, что хотите удалить станок {machine['name']}?",
+            reply_markup=kb.del_machines)
+        # Сохраняем станок для удаления в состояние
+        await state.update_data(machine_to_remove=machine_to_remove)
     else:
         # Сохраняем текущее состояние перед переходом к новому
         await state.update_data(previous_state=await state.get_state())
@@ -1267,15 +1294,9 @@ async def confirm_delete(callback: CallbackQuery, state: FSMContext):
         'machine_to_remove')  # Получаем станок для удаления
 
     if machine_to_remove:
-        shop_number = user_data.get('selected_shop').split(
-            '-')[0]  # Получаем номер цеха
-        machines_data = load_machines_data()  # Загружаем данные станков
-        # Получаем список станков для выбранного цеха
-        machines = machines_data.get(f'maschines_{shop_number}', [])
-
-        machines.remove(machine_to_remove)  # Удаляем станок из списка
+        shop_number = machine_to_remove['shop']  # Получаем номер цеха
         try:
-            save_machines_data(machines_data)  # Сохраняем обновленные данные
+            await catalog.remove_machine(machine_to_remove['id'])
             logger.info(
                 f"Пользователь {callback.from_user.id} удалил станок '{machine_to_remove['name']}' из цеха {shop_number}.")
             await callback.message.edit_text(f'✅ Станок {machine_to_remove["name"]} удален.', parse_mode="HTML")
@@ -1336,7 +1357,7 @@ async def process_simple_calendar(callback_query: CallbackQuery, callback_data:
 
 
 # привязка к кнопке назад
-@router.callback_query(F.data == "back_to_calendar")
+@router.callback_query(DateCallback.filter(F.action == DateAction.back))
 async def back_to_calendar(callback: CallbackQuery, state: FSMContext):
     logger.info(f"Пользователь {callback.from_user.id} вернулся к календарю.")
     current_state = await state.get_state()
@@ -1355,7 +1376,7 @@ async def back_to_calendar(callback: CallbackQuery, state: FSMContext):
 
 
 # привязка к кнопке подтвердить
-@router.callback_query(F.data == "confirm_date")
+@router.callback_query(DateCallback.filter(F.action == DateAction.confirm))
 async def confirm_date(callback: CallbackQuery, state: FSMContext):
     current_state = await state.get_state()
     if current_state == Register.date_end.state or current_state == Register.today_date.state:
@@ -1,8 +1,7 @@
 from aiogram.types import (ReplyKeyboardMarkup, KeyboardButton,
                            InlineKeyboardMarkup, InlineKeyboardButton)
-from app.data_shops import *
-import json
-import os
+from app.catalog import catalog
+from app.callbacks import ShopCallback, MachineCallback, MachineAction, DateCallback, DateAction
 
 main = ReplyKeyboardMarkup(
     keyboard=[
@@ -21,8 +20,8 @@ main = ReplyKeyboardMarkup(
 
 # Создаем клавиатуру с кнопками "Подтвердить" и "Назад"
 markup = InlineKeyboardMarkup(inline_keyboard=[[
-    InlineKeyboardButton(text="↩️ Назад", callback_data="back_to_calendar"),
-    InlineKeyboardButton(text="✅ Подтвердить", callback_data="confirm_date")]])
+    InlineKeyboardButton(text="↩️ Назад", callback_data=DateCallback(action=DateAction.back).pack()),
+    InlineKeyboardButton(text="✅ Подтвердить", callback_data=DateCallback(action=DateAction.confirm).pack())]])
 
 
 clear_chat = ReplyKeyboardMarkup(keyboard=[[KeyboardButton(text='✅ Да'), KeyboardButton(
@@ -74,7 +73,8 @@ admin_menu = ReplyKeyboardMarkup(
          KeyboardButton(text='📢 Рассылка')],
         [KeyboardButton(text='📄 Посмотреть логи'),
          KeyboardButton(text='💾 Резервная копия БД')],
-        [KeyboardButton(text='🕒 Автокопирование БД')],
+        [KeyboardButton(text='🕒 Автокопирование БД'),
+         KeyboardButton(text='🧹 Обслуживание БД')],
         [KeyboardButton(text='🔄 Восстановить БД из копии')],
         [KeyboardButton(text='↩️ В главное меню')]
     ],
@@ -87,6 +87,7 @@ admin_menu = ReplyKeyboardMarkup(
 
 auto_backup_menu = ReplyKeyboardMarkup(
     keyboard=[
+        [KeyboardButton(text='⏱ Раз в час')],
         [KeyboardButton(text='🔁 Раз в день')],
         [KeyboardButton(text='📅 Раз в неделю')],
         [KeyboardButton(text='🗓 Раз в месяц')],
@@ -130,30 +131,19 @@ personal_main = InlineKeyboardMarkup(inline_keyboard=[
 ])
 
 
-# Кнопки цеха
-workshops = InlineKeyboardMarkup(inline_keyboard=[
-    [InlineKeyboardButton(text='🔧 1 цех', callback_data='1-shop'),
-     InlineKeyboardButton(text='⚙️ 2 цех', callback_data='2-shop'),
-     InlineKeyboardButton(text='🏭 3 цех', callback_data='3-shop')],
-    [InlineKeyboardButton(text='📦 11 цех', callback_data='11-shop'),
-     InlineKeyboardButton(text='🔬 15 цех', callback_data='15-shop'),
-     InlineKeyboardButton(text='🔥 17 цех', callback_data='17-shop')],
-    [InlineKeyboardButton(text='💡 20 цех', callback_data='20-shop'),
-     InlineKeyboardButton(text='🛠️ 26 цех', callback_data='26-shop'),
-     InlineKeyboardButton(text='⚙️ КМТ', callback_data='kmt-shop')]])
+def create_keyboard(machine_list, shop_number, action=MachineAction.select):
+    def machine_button(machine):
+        return InlineKeyboardButton(text=machine['name'], callback_data=MachineCallback(
+            shop=shop_number, machine=machine['id'], action=action).pack())
 
-
-def create_keyboard(machine_list):
     buttons = []
     for i in range(0, len(machine_list), 2):
         row = []
         # Добавляем первую кнопку в ряд
-        row.append(InlineKeyboardButton(
-            text=machine_list[i]['name'], callback_data=machine_list[i]['name']))
+        row.append(machine_button(machine_list[i]))
         # Проверяем, есть ли следующая кнопка
         if i + 1 < len(machine_list):
-            row.append(InlineKeyboardButton(
-                text=machine_list[i + 1]['name'], callback_data=machine_list[i + 1]['name']))
+            row.append(machine_button(machine_list[i + 1]))
         else:
             # Если следующей кнопки нет, добавляем пустую кнопку
             row.append(InlineKeyboardButton(text=" ", callback_data="ignore"))
@@ -165,39 +155,42 @@ def create_keyboard(machine_list):
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
 
-# Загрузите данные из файла JSON
-FILE_PATH = "json/machines_data.json"  # Путь к вашему JSON файлу
-
-
-def load_machines():
-    if os.path.exists(FILE_PATH):
-        with open(FILE_PATH, 'r', encoding='utf-8') as file:
-            return json.load(file)
-    else:
-        return {
-            "maschines_1": [],
-            "maschines_2": [],
-            "maschines_3": [],
-            "maschines_11": [],
-            "maschines_15": [],
-            "maschines_17": [],
-            "maschines_20": [],
-            "maschines_26": [],
-            "maschines_kmt": [],
-        }
-
-
-# Загружаем данные о станках из JSON файла
-machines_data = load_machines()
-# Создаем клавиатуры для каждого цеха
-shops_1 = create_keyboard(load_machines()['maschines_1'])
-shops_2 = create_keyboard(load_machines()['maschines_2'])
-shops_3 = create_keyboard(load_machines()['maschines_3'])
-shops_11 = create_keyboard(load_machines()['maschines_11'])
-shops_15 = create_keyboard(load_machines()['maschines_15'])
-shops_17 = create_keyboard(load_machines()['maschines_17'])
-shops_20 = create_keyboard(load_machines()['maschines_20'])
-shops_26 = create_keyboard(load_machines()['maschines_26'])
-shops_kmt = create_keyboard(load_machines()['maschines_kmt'])
+def create_workshops_keyboard(shop_list):
+    # Кнопки цехов по три в ряд
+    buttons = [
+        [InlineKeyboardButton(text=shop['title'], callback_data=ShopCallback(shop=shop['code']).pack())
+         for shop in shop_list[i:i + 3]]
+        for i in range(0, len(shop_list), 3)]
+    return InlineKeyboardMarkup(inline_keyboard=buttons)
+
+
+class ShopKeyboards:
+    """Клавиатуры цехов и станков: собираются один раз и хранятся в памяти.
+
+    Клавиатура цеха строится из справочника при первом запросе и
+    пересобирается, только когда изменилась версия станков этого цеха.
+    """
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+        self._keyboards = {}
+        self._workshops = None
+
+    def get(self, shop_number: str, action=MachineAction.select) -> InlineKeyboardMarkup:
+        version = self.catalog.version(shop_number)
+        cached = self._keyboards.get((shop_number, action))
+        if cached is None or cached[0] != version:
+            cached = (version, create_keyboard(self.catalog.machines(shop_number), shop_number, action))
+            self._keyboards[(shop_number, action)] = cached
+        return cached[1]
+
+    def workshops(self) -> InlineKeyboardMarkup:
+        """Кнопки выбора цеха."""
+        shops = tuple((shop['code'], shop['title']) for shop in self.catalog.shops())
+        if self._workshops is None or self._workshops[0] != shops:
+            self._workshops = (shops, create_workshops_keyboard(self.catalog.shops()))
+        return self._workshops[1]
 
 
+# Клавиатуры цехов и станков для всех модулей бота
+shop_keyboards = ShopKeyboards(catalog)
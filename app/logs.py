@@ -3,7 +3,7 @@ import logging
 from collections import deque
 from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton, FSInputFile
-from app.handlers import get_user_role, load_access_data
+from app.access import Role
 
 # Создаём роутер для логов
 router_logs = Router()
@@ -13,14 +13,11 @@ LOG_FILES = ['logs/bot.log', 'logs/bot.log.1', 'logs/bot.log.2']
 
 
 @router_logs.message(F.text == '📄 Посмотреть логи')
-async def view_logs_menu(message: Message):
+async def view_logs_menu(message: Message, role: Role):
     """
     Показывает меню для выбора файла логов.
     """
-    data = load_access_data()
-    user_id = message.from_user.id  # Получаем ID пользователя
-    role = get_user_role(user_id, data)
-    if role in ["👑 Главный администратор!", "🛠 Администратор!"]:
+    if role >= Role.ADMIN:
         try:
             # Проверяем, какие файлы существуют
             available_files = [f for f in LOG_FILES if os.path.exists(f)]
@@ -47,15 +44,13 @@ async def view_logs_menu(message: Message):
 
 
 @router_logs.callback_query(F.data.startswith("logs:"))
-async def view_selected_logs(callback: CallbackQuery):
+async def view_selected_logs(callback: CallbackQuery, role: Role):
     """
     Обрабатывает выбор файла и отправляет логи.
     """
     # Проверка доступа
-    data = load_access_data()
     user_id = callback.from_user.id
-    role = get_user_role(user_id, data)
-    if role not in ["👑 Главный администратор!", "🛠 Администратор!"]:
+    if role < Role.ADMIN:
         await callback.answer("⛔ У вас нет доступа.", show_alert=True)
         return
 
@@ -0,0 +1,170 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import time
+from datetime import datetime, timedelta
+from app.database import (DB_PATH, pool, _fetch_search_page, get_history_between,
+                          get_downtime_by_machine)
+
+logger = logging.getLogger(__name__)
+
+MAINTENANCE_REPORT_FILE = 'json/maintenance_report.json'
+# Когда запускать обслуживание (cron, местное время) — ночью, вне смен
+MAINTENANCE_CRON = os.getenv('MAINTENANCE_CRON', '30 3 * * *')
+# Случайный сдвиг запуска (секунды)
+MAINTENANCE_JITTER = 600
+# Сколько строк индекса просматривает ANALYZE (PRAGMA analysis_limit, 0 — все)
+ANALYZE_LIMIT = 1000
+# incremental_vacuum: страниц за шаг и общий бюджет времени (секунды)
+VACUUM_PAGES_PER_STEP = 256
+VACUUM_TIME_BUDGET = 30
+# Бюджет времени проверки целостности (секунды)
+CHECK_TIME_BUDGET = 120
+# Как часто SQLite вызывает обработчик прогресса (в инструкциях виртуальной машины)
+CHECK_PROGRESS_OPS = 10000
+# Сколько раз повторять каждый замер времени запросов (берётся лучший)
+BENCHMARK_ROUNDS = 3
+
+
+async def _database_size() -> dict:
+    async with pool.reader() as db:
+        sizes = {}
+        for pragma in ('page_size', 'page_count', 'freelist_count'):
+            async with db.execute(f"PRAGMA {pragma}") as cursor:
+                sizes[pragma] = (await cursor.fetchone())[0]
+    return {
+        'bytes': sizes['page_size'] * sizes['page_count'],
+        'pages': sizes['page_count'],
+        'free_pages': sizes['freelist_count'],
+        'page_size': sizes['page_size'],
+    }
+
+
+async def _benchmark() -> dict:
+    """Время типичных запросов бота в миллисекундах (лучшее из BENCHMARK_ROUNDS)."""
+    now = datetime.now()
+    queries = {
+        'история за сутки': lambda: get_history_between(now - timedelta(hours=24)),
+        'простой по станкам за месяц': lambda: get_downtime_by_machine(since=now - timedelta(days=30)),
+        # Поиск мимо search_cache: из кэша результат пришёл бы без обращения к БД
+        'поиск': lambda: _fetch_search_page('станок'),
+    }
+    timings = {}
+    for name, query in queries.items():
+        best = None
+        for _ in range(BENCHMARK_ROUNDS):
+            started = time.perf_counter()
+            await query()
+            elapsed = (time.perf_counter() - started) * 1000
+            best = elapsed if best is None else min(best, elapsed)
+        timings[name] = round(best, 2)
+    return timings
+
+
+async def analyze():
+    """Обновляет статистику планировщика запросов (ANALYZE с ограничением выборки, PRAGMA optimize)."""
+    async with pool.writer() as db:
+        await db.execute(f"PRAGMA analysis_limit={ANALYZE_LIMIT}")
+        await db.execute("ANALYZE")
+        await db.execute("PRAGMA optimize")
+        await db.commit()
+
+
+async def incremental_vacuum(budget: float = VACUUM_TIME_BUDGET) -> int:
+    """Возвращает свободные страницы файлу шагами по VACUUM_PAGES_PER_STEP.
+
+    Между шагами писатель освобождается, так что запись не ждёт дольше одного
+    шага. Останавливается, когда свободных страниц не осталось или вышло
+    время budget. Возвращает число освобождённых страниц.
+    """
+    deadline = time.monotonic() + budget
+    freed = 0
+    while time.monotonic() < deadline:
+        async with pool.writer() as db:
+            async with db.execute("PRAGMA freelist_count") as cursor:
+                before = (await cursor.fetchone())[0]
+            if before == 0:
+                break
+            async with db.execute(f"PRAGMA incremental_vacuum({VACUUM_PAGES_PER_STEP})") as cursor:
+                await cursor.fetchall()
+            await db.commit()
+            async with db.execute("PRAGMA freelist_count") as cursor:
+                after = (await cursor.fetchone())[0]
+        freed += before - after
+        if after >= before:
+            break
+        await asyncio.sleep(0)
+    return freed
+
+
+def _check_integrity(path: str, budget: float) -> str:
+    """PRAGMA integrity_check на отдельном соединении только для чтения (выполняется в потоке).
+
+    Если проверка не уложилась в budget секунд, она прерывается.
+    """
+    deadline = time.monotonic() + budget
+    db = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    # Ненулевой ответ обработчика прогресса прерывает запрос
+    db.set_progress_handler(lambda: int(time.monotonic() > deadline), CHECK_PROGRESS_OPS)
+    try:
+        rows = db.execute("PRAGMA integrity_check").fetchall()
+    except sqlite3.OperationalError:
+        if time.monotonic() > deadline:
+            return 'timeout'
+        raise
+    finally:
+        db.close()
+    return 'ok' if rows == [('ok',)] else '; '.join(row[0] for row in rows[:5])
+
+
+async def run_maintenance() -> dict:
+    """Обслуживание БД: ANALYZE, optimize, incremental_vacuum и проверка целостности.
+
+    Размер файла и время типичных запросов замеряются до и после; отчёт
+    сохраняется в MAINTENANCE_REPORT_FILE и возвращается.
+    """
+    started = datetime.now()
+    report = {'started': started.isoformat(timespec='seconds'), 'steps': {}}
+    report['size_before'] = await _database_size()
+    report['timings_before'] = await _benchmark()
+
+    async def step(name, coro):
+        step_started = time.perf_counter()
+        result = await coro
+        report['steps'][name] = round(time.perf_counter() - step_started, 3)
+        return result
+
+    await step('analyze', analyze())
+    report['freed_pages'] = await step('incremental_vacuum', incremental_vacuum())
+    report['integrity'] = await step(
+        'integrity_check', asyncio.to_thread(_check_integrity, DB_PATH, CHECK_TIME_BUDGET))
+
+    report['size_after'] = await _database_size()
+    report['timings_after'] = await _benchmark()
+    report['finished'] = datetime.now().isoformat(timespec='seconds')
+    report['duration'] = round((datetime.now() - started).total_seconds(), 3)
+
+    save_report(report)
+    if report['integrity'] not in ('ok', 'timeout'):
+        logger.error(f"Обслуживание БД: проверка целостности не пройдена: {report['integrity']}")
+    logger.info(
+        f"Обслуживание БД за {report['duration']:.1f} с: освобождено страниц {report['freed_pages']}, "
+        f"размер {report['size_before']['bytes'] // 1024} → {report['size_after']['bytes'] // 1024} КБ, "
+        f"целостность: {report['integrity']}")
+    return report
+
+
+def save_report(report: dict):
+    os.makedirs(os.path.dirname(MAINTENANCE_REPORT_FILE), exist_ok=True)
+    with open(MAINTENANCE_REPORT_FILE, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=4)
+
+
+def load_last_report():
+    """Последний отчёт обслуживания или None, если обслуживание ещё не запускалось."""
+    if not os.path.exists(MAINTENANCE_REPORT_FILE):
+        return None
+    with open(MAINTENANCE_REPORT_FILE, 'r', encoding='utf-8') as f:
+        return json.load(f)
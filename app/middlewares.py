@@ -0,0 +1,37 @@
+from typing import Any, Awaitable, Callable, Dict
+from aiogram import BaseMiddleware
+from aiogram.filters import Filter
+from aiogram.types import TelegramObject
+from app.access import Role, access
+
+
+class RoleMiddleware(BaseMiddleware):
+    """Определяет уровень доступа один раз на апдейт и передаёт его обработчикам.
+
+    Регистрируется внешним middleware на dp.update; обработчики и фильтры
+    получают его аргументом role: Role.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        user = data.get('event_from_user')
+        data['role'] = access.level(user.id) if user else Role.NONE
+        return await handler(event, data)
+
+
+class RoleFilter(Filter):
+    """Пропускает апдейт, если уровень доступа не ниже min_role.
+
+    Пример: router.message.filter(RoleFilter(Role.ADMIN)) или
+    @router.message(F.text == '...', RoleFilter(Role.MAIN_ADMIN)).
+    """
+
+    def __init__(self, min_role: Role):
+        self.min_role = min_role
+
+    async def __call__(self, event: TelegramObject, role: Role = Role.NONE) -> bool:
+        return role >= self.min_role
@@ -0,0 +1,83 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Сколько строк обрабатывает одна транзакция при заполнении данных миграцией
+MIGRATION_BATCH_SIZE = 500
+
+
+class SchemaVersionError(RuntimeError):
+    """Схема БД новее, чем знает этот код (бот запускать нельзя)."""
+
+
+class Migration:
+    """Шаг миграции схемы: номер версии, описание и корутина apply(pool).
+
+    Шаги должны быть повторяемыми: если бот остановится посреди миграции,
+    при следующем запуске она выполнится заново с начала.
+    """
+
+    def __init__(self, version: int, description: str, apply):
+        self.version = version
+        self.description = description
+        self.apply = apply
+
+
+async def get_schema_version(pool) -> int:
+    async with pool.reader() as db:
+        async with db.execute("PRAGMA user_version") as cursor:
+            return (await cursor.fetchone())[0]
+
+
+async def add_column(db, table: str, column: str, declaration: str):
+    """ALTER TABLE ADD COLUMN, если такой колонки ещё нет."""
+    async with db.execute(f"PRAGMA table_info({table})") as cursor:
+        columns = [row[1] for row in await cursor.fetchall()]
+    if column not in columns:
+        await db.execute(f"ALTER TABLE {table} ADD COLUMN {column} {declaration}")
+
+
+async def run_in_batches(pool, table: str, sql: str, batch_size: int = MIGRATION_BATCH_SIZE):
+    """Выполняет sql по диапазонам rowid таблицы, каждый диапазон — отдельной транзакцией.
+
+    sql должен ограничивать строки параметрами :lo и :hi (rowid > :lo AND rowid <= :hi).
+    Между пачками писатель освобождается, поэтому таблица не блокируется надолго.
+    """
+    async with pool.reader() as db:
+        async with db.execute(f"SELECT COALESCE(MAX(rowid), 0) FROM {table}") as cursor:
+            max_rowid = (await cursor.fetchone())[0]
+    for lo in range(0, max_rowid, batch_size):
+        async with pool.writer() as db:
+            await db.execute(sql, {"lo": lo, "hi": lo + batch_size})
+            await db.commit()
+    if max_rowid:
+        logger.info(f"Обработано строк {table}: до rowid {max_rowid}, пачками по {batch_size}.")
+
+
+async def migrate(pool, migrations):
+    """Применяет к БД миграции с версией больше PRAGMA user_version, по порядку.
+
+    После каждого шага версия сохраняется, так что прерванная миграция
+    продолжится с того же шага. Если версия БД больше последней известной,
+    бросает SchemaVersionError.
+    """
+    migrations = sorted(migrations, key=lambda m: m.version)
+    latest = migrations[-1].version if migrations else 0
+    current = await get_schema_version(pool)
+    if current > latest:
+        logger.critical(
+            f"Версия схемы БД {current} новее поддерживаемой {latest}. Обновите бота.")
+        raise SchemaVersionError(
+            f"Версия схемы БД {current} новее поддерживаемой ботом ({latest})")
+
+    for migration in migrations:
+        if migration.version <= current:
+            continue
+        logger.info(f"Миграция {migration.version}: {migration.description}...")
+        await migration.apply(pool)
+        async with pool.writer() as db:
+            await db.execute(f"PRAGMA user_version = {int(migration.version)}")
+            await db.commit()
+        current = migration.version
+        logger.info(f"Миграция {migration.version} применена.")
+    return current
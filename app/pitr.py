@@ -0,0 +1,260 @@
+import asyncio
+import logging
+import os
+import sqlite3
+import zlib
+from datetime import datetime
+from app.database import DB_PATH, pool
+from app.backup import swap_database
+from app.backup_store import WAL_ARCHIVE_DIR, store
+
+logger = logging.getLogger(__name__)
+
+# Восстановление на момент времени (PITR): включается переменной окружения
+PITR_ENABLED = os.getenv('PITR_ENABLED', '0').lower() in ('1', 'true', 'yes')
+# Как часто архивировать WAL (секунды) — это и есть точность восстановления;
+# архивирование запускается планировщиком (см. telegram_bot.py)
+PITR_ARCHIVE_INTERVAL = int(os.getenv('PITR_ARCHIVE_INTERVAL', '60'))
+# Заголовок WAL-файла без кадров
+WAL_HEADER_SIZE = 32
+SEGMENT_TIME_FORMAT = '%Y%m%d%H%M%S'
+
+# Архивирование WAL, подмена БД и начало новой цепочки идут строго по очереди:
+# иначе плановое архивирование, дождавшись конца паузы, положит WAL
+# восстановленной базы в цепочку прежнего базового снимка
+_timeline_lock = asyncio.Lock()
+
+# Как это работает:
+# * автоматический checkpoint отключён (wal_autocheckpoint=0), поэтому все
+#   изменения копятся в bot_data.db-wal;
+# * archive_wal() под блокировкой писателя сохраняет содержимое WAL как
+#   очередной сегмент и делает wal_checkpoint(TRUNCATE);
+# * new_timeline() копирует БД в момент сразу после checkpoint и делает из
+#   копии базовый снимок — сегменты, архивированные после него, ложатся на
+#   него без пропусков;
+# * restore_to_time() собирает базовый снимок и по очереди применяет к нему
+#   сегменты, архивированные не позже выбранного момента;
+# * swap_with_timeline() подменяет БД между архивированием и новой цепочкой.
+
+
+def _base_dir(base_id: str) -> str:
+    return os.path.join(WAL_ARCHIVE_DIR, base_id)
+
+
+def current_base():
+    """Последний базовый снимок PITR (манифест) или None."""
+    for manifest in store.list_snapshots():
+        if manifest.get('pitr_base'):
+            return manifest
+    return None
+
+
+def list_segments(base_id: str):
+    """Сегменты WAL базового снимка по порядку: [{'seq', 'archived_at', 'path'}, ...].
+
+    Список обрывается на первом пропуске номера, дальше применять сегменты нельзя.
+    """
+    base_dir = _base_dir(base_id)
+    if not os.path.exists(base_dir):
+        return []
+    segments = []
+    for name in sorted(os.listdir(base_dir)):
+        if not name.endswith('.wal.z'):
+            continue
+        seq, archived_at = name[:-len('.wal.z')].split('_')
+        segments.append({
+            'seq': int(seq),
+            'archived_at': datetime.strptime(archived_at, SEGMENT_TIME_FORMAT),
+            'path': os.path.join(base_dir, name),
+        })
+    contiguous = []
+    for expected, segment in enumerate(segments, 1):
+        if segment['seq'] != expected:
+            break
+        contiguous.append(segment)
+    return contiguous
+
+
+def _read_wal(path: str) -> bytes:
+    if not os.path.exists(path):
+        return b''
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def _write_segment(path: str, data: bytes):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + '.tmp', 'wb') as f:
+        f.write(zlib.compress(data))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(path + '.tmp', path)
+
+
+def _copy_base(target_path: str):
+    """Копия БД одним шагом backup API (выполняется в потоке под блокировкой писателя)."""
+    source = sqlite3.connect(DB_PATH)
+    target = sqlite3.connect(target_path)
+    try:
+        source.backup(target)
+    finally:
+        target.close()
+        source.close()
+
+
+async def _checkpoint(db) -> bool:
+    async with db.execute("PRAGMA wal_checkpoint(TRUNCATE)") as cursor:
+        busy, _, _ = await cursor.fetchone()
+    return not busy
+
+
+async def archive_wal():
+    """Сохраняет текущий WAL сегментом текущего базового снимка и обнуляет его.
+
+    Пока сегмент пишется, писатель заблокирован, поэтому в WAL не попадают
+    новые кадры. Если checkpoint не удался (занят читателем), сегмент
+    удаляется — те же кадры попадут в архив в следующий раз. Если базового
+    снимка нет, WAL не сбрасывается, а начинается новая цепочка.
+    """
+    async with _timeline_lock:
+        return await _archive_wal()
+
+
+async def _archive_wal():
+    base = current_base()
+    if base is None:
+        logger.error("PITR: базовый снимок не найден, начинается новая цепочка.")
+        await _new_timeline()
+        return None
+    async with pool.writer() as db:
+        data = await asyncio.to_thread(_read_wal, DB_PATH + '-wal')
+        if len(data) <= WAL_HEADER_SIZE:
+            await _checkpoint(db)
+            return None
+        segments = list_segments(base['id'])
+        seq = segments[-1]['seq'] + 1 if segments else 1
+        archived_at = datetime.now()
+        path = os.path.join(
+            _base_dir(base['id']), f"{seq:06d}_{archived_at.strftime(SEGMENT_TIME_FORMAT)}.wal.z")
+        await asyncio.to_thread(_write_segment, path, data)
+        if not await _checkpoint(db):
+            os.remove(path)
+            logger.warning("PITR: checkpoint занят, архивирование WAL отложено.")
+            return None
+    logger.info(f"PITR: сегмент WAL {seq} ({len(data) // 1024} КБ) сохранён для снимка {base['id']}")
+    return path
+
+
+async def new_timeline():
+    """Начинает новую цепочку: checkpoint и базовый снимок, выровненный по нему.
+
+    Вызывается при включении режима и после каждого восстановления. Писатель
+    заблокирован только на checkpoint и копирование файла; нарезка копии на
+    куски идёт уже без него.
+    """
+    async with _timeline_lock:
+        return await _new_timeline()
+
+
+async def _new_timeline():
+    base_path = DB_PATH + '.base'
+    try:
+        async with pool.writer() as db:
+            await _checkpoint(db)
+            await asyncio.to_thread(_copy_base, base_path)
+        manifest = await store.snapshot(extra={'pitr_base': True}, source_path=base_path)
+    finally:
+        if os.path.exists(base_path):
+            os.remove(base_path)
+    logger.info(f"PITR: базовый снимок {manifest['id']}")
+    return manifest
+
+
+async def start_pitr():
+    """Включает режим PITR: отключает автоматический checkpoint и делает базовый снимок."""
+    pool.wal_autocheckpoint = 0
+    async with pool.writer() as db:
+        await db.execute("PRAGMA wal_autocheckpoint=0")
+    await new_timeline()
+    logger.info(f"PITR включён, WAL архивируется раз в {PITR_ARCHIVE_INTERVAL} с.")
+
+
+async def stop_pitr():
+    """Архивирует остаток WAL перед остановкой (закрытие БД сделает checkpoint)."""
+    if PITR_ENABLED:
+        await archive_wal()
+
+
+def plan_restore(target: datetime):
+    """Что будет применено для восстановления на момент target.
+
+    Возвращает {'base': манифест, 'segments': [...], 'restored_to': datetime}
+    или None, если базового снимка до этого момента нет.
+    """
+    for manifest in store.list_snapshots():
+        created = datetime.fromisoformat(manifest['created'])
+        if manifest.get('pitr_base') and created <= target:
+            segments = [s for s in list_segments(manifest['id']) if s['archived_at'] <= target]
+            restored_to = segments[-1]['archived_at'] if segments else created
+            return {'base': manifest, 'segments': segments, 'restored_to': restored_to}
+    return None
+
+
+def _replay_segments(db_path: str, segments):
+    """Применяет сегменты WAL к файлу БД по одному (выполняется в потоке)."""
+    db = sqlite3.connect(db_path)
+    db.execute("PRAGMA journal_mode=WAL")
+    db.close()
+    for segment in segments:
+        with open(segment['path'], 'rb') as f:
+            data = zlib.decompress(f.read())
+        with open(db_path + '-wal', 'wb') as f:
+            f.write(data)
+        # При открытии SQLite восстанавливает кадры из WAL, checkpoint переносит их в файл
+        db = sqlite3.connect(db_path)
+        try:
+            busy, _, _ = db.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+            if busy:
+                raise RuntimeError(f"Не удалось применить сегмент {segment['seq']}")
+        finally:
+            db.close()
+    for suffix in ('-wal', '-shm'):
+        if os.path.exists(db_path + suffix):
+            os.remove(db_path + suffix)
+
+
+async def restore_to_time(target: datetime):
+    """Восстанавливает БД на момент target. Возвращает (пауза записи в с, фактический момент)."""
+    plan = plan_restore(target)
+    if plan is None:
+        raise ValueError("Нет базового снимка раньше выбранного времени")
+
+    staging_path = DB_PATH + '.restore'
+    try:
+        await store.restore(plan['base']['id'], staging_path)
+        await asyncio.to_thread(_replay_segments, staging_path, plan['segments'])
+    except Exception:
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(staging_path + suffix):
+                os.remove(staging_path + suffix)
+        raise
+
+    pause = await swap_with_timeline(staging_path)
+    return pause, plan['restored_to']
+
+
+async def swap_with_timeline(staging_path: str) -> float:
+    """Подменяет БД файлом staging_path (swap_database). Возвращает паузу записи в с.
+
+    В режиме PITR текущий WAL сначала уходит в архив, а после подмены
+    начинается новая цепочка; все три шага — под одной блокировкой с
+    archive_wal(), так что плановое архивирование между ними не вклинится.
+    """
+    if not PITR_ENABLED:
+        return await swap_database(staging_path)
+    async with _timeline_lock:
+        # Текущее состояние тоже остаётся в архиве — к нему можно будет вернуться
+        await _archive_wal()
+        pause = await swap_database(staging_path)
+        await _new_timeline()
+    return pause
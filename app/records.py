@@ -11,13 +11,13 @@ import uuid
 import time
 from aiogram.types import InputFile
 import aiosqlite 
-from app.data_shops import shops
 import pandas as pd
 import os  # Для работы с файлами и папками
 import logging
 from dotenv import load_dotenv
 import json
-from app.database import search_data, get_today_history
+from app.database import (search_data, search_page, count_search, get_task, get_today_history,
+                          write_queue, index_task, with_derived_columns)
 from googleapiclient.discovery import build  # Для Drive API
 import io  # Для работы с BytesIO
 from google.auth.transport.requests import Request
@@ -30,6 +30,8 @@ from reportlab.lib import colors
 from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
 import app.keyboards as kb
+from app.access import Role
+from app.callbacks import RecordCallback, RecordAction
 import asyncio
 
 
@@ -39,8 +41,6 @@ load_dotenv('token.env')  # Загружаем переменные окруже
 logger = logging.getLogger(__name__)
 
 # Путь к файлу, где будут храниться данные
-FILE_PATH = 'json/machines_data.json'
-FILE_PATH_ACCESS = 'json/access_user.json'
 DRIVE_FILES_PATH = 'json/drive_files.json'
 spreadsheet_id = os.getenv('GOOGLE_SHEET_KEY')
 credentials_path = os.getenv('GOOGLE_CREDENTIALS_PATH')
@@ -48,23 +48,6 @@ credentials_path = os.getenv('GOOGLE_CREDENTIALS_PATH')
 TEMP_DIR = 'temp files'
 TEMP_FOLDER_ID = '1ihS9eD7QHZa0xsru_VKq_YKuEnN3T3iA'
 
-# Функция для загрузки данных из JSON файла
-
-
-def load_access_data():
-    """Загружает данные пользователей из JSON-файла или создает структуру, если файл пуст/не существует."""
-    try:
-        with open(FILE_PATH_ACCESS, "r", encoding="utf-8") as file:
-            return json.load(file)
-    except (FileNotFoundError, json.JSONDecodeError) as e:
-        logger.warning(f"Файл доступа не найден или поврежден: {e}")
-        return {
-            "main_admins": [],
-            "admins": [],
-            "users": []
-        }
-
-
 # Функция сохранения истории файлов в JSON
 
 
@@ -73,20 +56,6 @@ def save_drive_files(files_list):
     with open(DRIVE_FILES_PATH, "w", encoding="utf-8") as file:
         json.dump(files_list, file, ensure_ascii=False, indent=4)
 
-# функция определения уровня доступа
-
-
-def get_user_role(user_id, data):
-    if user_id in data['main_admins']:
-        return "👑 Главный администратор!"
-    elif user_id in data['admins']:
-        return "🛠 Администратор!"
-    elif user_id in data['users']:
-        return "👥 Пользователь"
-    return None
-
-
-
 # Inline кнопка Главное меню
 inline_main_menu = InlineKeyboardMarkup(
     inline_keyboard=[
@@ -99,12 +68,9 @@ async def load_db_data():
     """Загружает все записи из БД (асинхронно)."""
     return await search_data("")
 
-async def run_search(phrase):
-    results = await search_data(phrase)
-    # Добавляем индекс строки, если нужно (для редактирования)
-    for idx, row in enumerate(results):
-        row["__row"] = idx + 1  # Нумерация с 1
-    return results
+async def run_search(phrase, before_id=None, after_id=None, limit=1):
+    """Страница результатов для просмотра/редактирования (по умолчанию одна запись)."""
+    return await search_page(phrase, before_id=before_id, after_id=after_id, limit=limit)
 
 # Регистрируем шрифт DejaVu Sans (предполагаем, что файл DejaVuSans.ttf в корне проекта)
 pdfmetrics.registerFont(TTFont('DejaVuSans', 'DejaVuSans.ttf'))
@@ -579,15 +545,13 @@ def cleanup_old_files():
 
 
 @router_records.message(F.text == '🔍 Поиск записи')
-async def start_search(message: Message, state: FSMContext):
-    data = load_access_data()  # Загружаем данные о пользователях
+async def start_search(message: Message, state: FSMContext, role: Role):
     user_id = message.from_user.id  # Получаем ID пользователя
-    role = get_user_role(user_id, data)
-    if role is None:
+    if role == Role.NONE:
         await message.answer("Доступ запрещён.")
         return
 
-    logger.info(f"Пользователь {user_id} ({role}) начал поиск записи.")
+    logger.info(f"Пользователь {user_id} ({role.title}) начал поиск записи.")
     await message.answer("Введите слово или фразу для поиска по базе (не может быть пустым):", reply_markup=ReplyKeyboardRemove())
     # Используем ваше существующее состояние
     await state.set_state(Register.search_record)
@@ -761,20 +725,22 @@ async def update_record_in_db(record_id, updated_data):
     :param record_id: int — ID записи для обновления.
     :param updated_data: dict — Словарь с полями для обновления.
     """
-    try:
-        conn = await aiosqlite.connect('bot_data.db')  # Путь к вашей БД
-        cursor = await conn.cursor()
-        
+    async def update(conn):
+        # Вместе с изменёнными полями пересчитываем производные колонки (поиск, ISO-время)
+        fields = await with_derived_columns(conn, record_id, updated_data)
         # Формируем SET-часть запроса динамически
-        set_clause = ', '.join([f"{k} = ?" for k in updated_data.keys()])
-        values = list(updated_data.values()) + [record_id]  # Добавляем ID
-        
+        set_clause = ', '.join([f"{k} = ?" for k in fields.keys()])
+        values = list(fields.values()) + [record_id]  # Добавляем ID
+
         # Выполняем UPDATE
-        query = f"UPDATE tasks SET {set_clause} WHERE id = ?"  
-        await cursor.execute(query, values)
-        
-        # Сохраняем изменения
-        await conn.commit()
+        query = f"UPDATE tasks SET {set_clause} WHERE id = ?"
+        await conn.execute(query, values)
+        # Пересчитываем запись в триграммном индексе поиска
+        await index_task(conn, record_id, fields['search_blob'])
+
+    try:
+        # Фиксация — в общей транзакции очереди записи вместе с другими правками
+        await write_queue.submit(update, tasks=True)
         
         # Логируем успех
         logger.info(f"Запись с ID {record_id} обновлена: {updated_data}")
@@ -782,17 +748,12 @@ async def update_record_in_db(record_id, updated_data):
     except aiosqlite.Error as e:
         logger.error(f"Ошибка при обновлении записи ID {record_id}: {e}")
         raise  # Перебрасываем для обработки
-    finally:
-        if conn:
-            await conn.close()
     
 
 @router_records.message(F.text == '✏️ Изменить запись')
-async def start_edit(message: Message, state: FSMContext):
-    data = load_access_data()
+async def start_edit(message: Message, state: FSMContext, role: Role):
     user_id = message.from_user.id
-    role = get_user_role(user_id, data)
-    if role is None:
+    if role == Role.NONE:
         await message.answer("Доступ запрещён.")
         return
 
@@ -820,6 +781,7 @@ async def process_search_phrase(message: Message, state: FSMContext):
     progress_msg = await message.answer("🔍 Идёт поиск, пожалуйста подождите...")
 
     try:
+        # Берём только первую запись и количество; остальные читаются при листании
         results = await run_search(phrase)
         await asyncio.sleep(0.5)
         await progress_msg.edit_text("⏳ Обработка результатов...")
@@ -835,8 +797,10 @@ async def process_search_phrase(message: Message, state: FSMContext):
                 parse_mode="HTML"
             )
 
-        # Сохраняем результаты и начинаем показ первой записи
-        await state.update_data(search_results=results, current_index=0, search_phrase=phrase)
+        # В состоянии храним только фразу и курсор (id текущей записи), а не весь список
+        total = await count_search(phrase)
+        await state.update_data(
+            search_phrase=phrase, current_id=results[0]["id"], current_index=0, search_total=total)
         await progress_msg.edit_text("📄 Подготовка к показу результатов...")
         await asyncio.sleep(0.3)  # Небольшая пауза перед открытием
         await progress_msg.delete()
@@ -855,12 +819,17 @@ async def process_search_phrase(message: Message, state: FSMContext):
 
 async def show_record(message: Message, state: FSMContext):
     data = await state.get_data()
-    results = data["search_results"]
     index = data["current_index"]
-    record = results[index].copy()
-    
+    total = data["search_total"]
+    record = await get_task(data["current_id"])
+    if record is None:
+        text = "❌ Запись не найдена (возможно, удалена)."
+        if isinstance(message, CallbackQuery):
+            await message.message.edit_text(text, reply_markup=inline_main_menu)
+        else:
+            await message.answer(text, reply_markup=inline_main_menu)
+        return
 
-    total = len(results)
     msg_text = (
         f"🚀 <b>ЗАЯВКА</b> <code>#{record['id']}</code>\n"
         f"📱 <b>СТРАНИЦА:</b> <code>{index + 1}/{total}</code>\n"
@@ -878,7 +847,7 @@ async def show_record(message: Message, state: FSMContext):
         f"🔢 <b>Инвентарный номер:</b> {record['inventory_number']}"
     )
 
-    keyboard = build_navigation_buttons(index, total)
+    keyboard = build_navigation_buttons(index, total, data["current_id"])
     if isinstance(message, CallbackQuery):
         await message.message.edit_text(msg_text, reply_markup=keyboard, parse_mode="HTML")
     else:
@@ -888,7 +857,7 @@ async def show_record(message: Message, state: FSMContext):
     
 
 
-def build_navigation_buttons(current_index, total):
+def build_navigation_buttons(current_index, total, current_id):
     buttons = []
 
     # Кнопки редактирования
@@ -902,9 +871,11 @@ def build_navigation_buttons(current_index, total):
 
     nav_buttons = []
     if current_index > 0:
-        nav_buttons.append(InlineKeyboardButton(text="⬅️ Предыдущая", callback_data="prev_record"))
+        nav_buttons.append(InlineKeyboardButton(text="⬅️ Предыдущая", callback_data=RecordCallback(
+            action=RecordAction.prev, record_id=current_id, index=current_index).pack()))
     if current_index < total - 1:
-        nav_buttons.append(InlineKeyboardButton(text="➡️ Следующая", callback_data="next_record"))
+        nav_buttons.append(InlineKeyboardButton(text="➡️ Следующая", callback_data=RecordCallback(
+            action=RecordAction.next, record_id=current_id, index=current_index).pack()))
 
     if nav_buttons:
         buttons.append(nav_buttons)
@@ -915,20 +886,29 @@ def build_navigation_buttons(current_index, total):
 
 
 # Обработка перехода между записями
-@router_records.callback_query(F.data.in_({"prev_record", "next_record"}))
-async def navigate_records(callback: CallbackQuery, state: FSMContext):
+@router_records.callback_query(RecordCallback.filter())
+async def navigate_records(callback: CallbackQuery, callback_data: RecordCallback, state: FSMContext):
     data = await state.get_data()
-    index = data["current_index"]
-    total = len(data["search_results"])
-
-    if callback.data == "prev_record" and index > 0:
-        await state.update_data(current_index=index - 1)
-    elif callback.data == "next_record" and index < total - 1:
-        await state.update_data(current_index=index + 1)
+    phrase = data["search_phrase"]
+    # Переход идёт от записи, показанной в сообщении с кнопкой
+    index = callback_data.index
+    current_id = callback_data.record_id
+
+    # Соседняя запись берётся из БД по ключу id текущей
+    if callback_data.action == RecordAction.prev and index > 0:
+        page = await run_search(phrase, after_id=current_id)
+        step = -1
+    elif callback_data.action == RecordAction.next and index < data["search_total"] - 1:
+        page = await run_search(phrase, before_id=current_id)
+        step = 1
     else:
+        page = []
+    if not page:
         await callback.answer()
         return
 
+    await state.update_data(current_id=page[0]["id"], current_index=index + step)
+
     await show_record(callback, state)
     await callback.answer()
 
@@ -945,9 +925,11 @@ async def start_field_edit(callback: CallbackQuery, state: FSMContext):
 
     field_key, prompt = field_map[callback.data]
     data = await state.get_data()
-    current_index = data["current_index"]
-    records = data["search_results"]
-    old_value = records[current_index][field_key]
+    record = await get_task(data["current_id"])
+    if record is None:
+        await callback.answer("Запись не найдена.", show_alert=True)
+        return
+    old_value = record[field_key]
 
     await state.update_data(editing_field=field_key, old_value=old_value)
     
@@ -1034,18 +1016,10 @@ async def confirm_save(callback: CallbackQuery, state: FSMContext):
     data = await state.get_data()
     field_to_update = data["editing_field"]
     new_value = data["new_value"]
-    current_index = data["current_index"]
-    records = data["search_results"]
-    record = records[current_index]
 
-    # Обновляем значение в памяти
-    record[field_to_update] = new_value
-    records[current_index] = record
-    await state.update_data(search_results=records)
-
-    # Сохраняем в БД
+    # Сохраняем в БД (show_record ниже перечитает запись уже с изменением)
     try:
-        await update_record_in_db(record["id"], {field_to_update: new_value})
+        await update_record_in_db(data["current_id"], {field_to_update: new_value})
         await callback.message.edit_text("✅ Поле успешно обновлено!", reply_markup=None)
     except Exception as e:
         logger.error(f"Ошибка при обновлении записи: {e}")
@@ -1066,19 +1040,6 @@ async def cancel_save(callback: CallbackQuery, state: FSMContext):
 
 
 
-# @router_records.message(F.text == '✏️ Изменить запись')
-# async def start_edit(message: Message, state: FSMContext):
-#     data = load_access_data()
-#     user_id = message.from_user.id
-#     role = get_user_role(user_id, data)
-#     if role is None:
-#         await message.answer("Доступ запрещён.")
-#         return
-
-#     logger.info(f"Пользователь {user_id} начал редактирование записи.")
-#     await message.answer("Введите слово или фразу для поиска по базе (не может быть пустым):", reply_markup=ReplyKeyboardRemove())
-#     await state.set_state(Register.edit_record)
-
 # # Обработчик фразы поиска
 # @router_records.message(StateFilter(Register.edit_record))
 # async def process_edit_phrase(message: Message, state: FSMContext):
@@ -0,0 +1,248 @@
+import asyncio
+import logging
+import random
+import time
+from datetime import datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+
+class IntervalTrigger:
+    """Запуск каждые seconds секунд."""
+
+    def __init__(self, seconds: float):
+        if seconds <= 0:
+            raise ValueError("Интервал должен быть больше нуля")
+        self.seconds = seconds
+
+    def next_after(self, moment: datetime) -> datetime:
+        return moment + timedelta(seconds=self.seconds)
+
+    def __repr__(self):
+        return f"каждые {self.seconds:g} с"
+
+
+def _parse_cron_field(field: str, low: int, high: int) -> set:
+    values = set()
+    for part in field.split(','):
+        step = 1
+        if '/' in part:
+            part, step = part.split('/')
+            step = int(step)
+        if part == '*':
+            start, end = low, high
+        elif '-' in part:
+            start, end = (int(x) for x in part.split('-'))
+        else:
+            start = int(part)
+            end = high if step > 1 else start
+        if start < low or end > high or start > end or step < 1:
+            raise ValueError(f"Неверное поле cron: {field}")
+        values.update(range(start, end + 1, step))
+    return values
+
+
+class CronTrigger:
+    """Запуск по расписанию cron: 'минуты часы дни_месяца месяцы дни_недели' (местное время).
+
+    Поддерживаются *, числа, списки через запятую, диапазоны a-b и шаг /n;
+    дни недели 0-6 (0 или 7 — воскресенье).
+    """
+
+    def __init__(self, expression: str):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"Выражение cron должно состоять из 5 полей: {expression}")
+        self.expression = expression
+        self.minutes = _parse_cron_field(fields[0], 0, 59)
+        self.hours = _parse_cron_field(fields[1], 0, 23)
+        self.days = _parse_cron_field(fields[2], 1, 31)
+        self.months = _parse_cron_field(fields[3], 1, 12)
+        self.weekdays = {d % 7 for d in _parse_cron_field(fields[4], 0, 7)}
+        self.any_day = fields[2] == '*'
+        self.any_weekday = fields[4] == '*'
+
+    def _day_matches(self, moment: datetime) -> bool:
+        day_ok = moment.day in self.days
+        weekday_ok = (moment.weekday() + 1) % 7 in self.weekdays
+        # Как в cron: если заданы и дни месяца, и дни недели, подходит любой из них
+        if not self.any_day and not self.any_weekday:
+            return day_ok or weekday_ok
+        return day_ok and weekday_ok
+
+    def next_after(self, moment: datetime) -> datetime:
+        candidate = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = candidate + timedelta(days=5 * 366)
+        while candidate < limit:
+            if candidate.month not in self.months:
+                year, month = divmod(candidate.month, 12)
+                candidate = candidate.replace(year=candidate.year + year, month=month + 1, day=1, hour=0, minute=0)
+            elif not self._day_matches(candidate):
+                candidate = (candidate + timedelta(days=1)).replace(hour=0, minute=0)
+            elif candidate.hour not in self.hours:
+                candidate = (candidate + timedelta(hours=1)).replace(minute=0)
+            elif candidate.minute not in self.minutes:
+                candidate += timedelta(minutes=1)
+            else:
+                return candidate
+        raise ValueError(f"Расписание cron никогда не срабатывает: {self.expression}")
+
+    def __repr__(self):
+        return f"cron '{self.expression}'"
+
+
+class Job:
+    """Задача планировщика и её статистика запусков."""
+
+    def __init__(self, name: str, func, trigger, jitter: float = 0, next_run: datetime = None):
+        self.name = name
+        self.func = func
+        self.trigger = trigger
+        self.jitter = jitter
+        self.next_run = next_run
+        self.task = None
+        self.runs = 0
+        self.failures = 0
+        self.skipped = 0
+        self.last_started = None
+        self.last_duration = None
+        self.last_error = None
+        self.total_duration = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self.task is not None and not self.task.done()
+
+    def schedule_next(self, after: datetime):
+        self.next_run = self.trigger.next_after(after)
+        if self.jitter:
+            self.next_run += timedelta(seconds=random.uniform(0, self.jitter))
+
+    def stats(self) -> dict:
+        return {
+            'trigger': repr(self.trigger),
+            'next_run': self.next_run,
+            'running': self.running,
+            'runs': self.runs,
+            'failures': self.failures,
+            'skipped': self.skipped,
+            'last_started': self.last_started,
+            'last_duration': self.last_duration,
+            'avg_duration': self.total_duration / self.runs if self.runs else None,
+            'last_error': self.last_error,
+        }
+
+
+class Scheduler:
+    """Планировщик фоновых задач бота (интервалы и cron).
+
+    Один цикл спит ровно до ближайшего запуска (или до изменения расписания),
+    поэтому без задач к выполнению пробуждений нет. Задача не запускается,
+    пока не завершился её предыдущий запуск: такой пропуск учитывается в skipped.
+    """
+
+    def __init__(self):
+        self.jobs = {}
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self._stopping = False
+
+    def add_job(self, name: str, func, trigger, jitter: float = 0, first_run: datetime = None) -> Job:
+        """Добавляет (или заменяет) задачу. func — корутинная функция без аргументов.
+
+        first_run — время первого запуска; по умолчанию — по расписанию от текущего момента.
+        """
+        old = self.jobs.get(name)
+        job = Job(name, func, trigger, jitter)
+        if old is not None:
+            # Незавершённый запуск старой версии задачи продолжает блокировать повтор
+            job.task = old.task
+        if first_run is not None:
+            job.next_run = first_run
+        else:
+            job.schedule_next(datetime.now())
+        self.jobs[name] = job
+        self._wakeup.set()
+        logger.info(f"Планировщик: задача {name} ({trigger!r}), первый запуск {job.next_run:%d.%m.%Y %H:%M:%S}")
+        return job
+
+    def reschedule(self, name: str, trigger=None, next_run: datetime = None):
+        """Меняет расписание задачи на лету; новый срок действует сразу."""
+        job = self.jobs[name]
+        if trigger is not None:
+            job.trigger = trigger
+        if next_run is not None:
+            job.next_run = next_run
+        else:
+            job.schedule_next(datetime.now())
+        self._wakeup.set()
+        logger.info(f"Планировщик: задача {name} перенесена ({job.trigger!r}), запуск {job.next_run:%d.%m.%Y %H:%M:%S}")
+
+    def remove_job(self, name: str):
+        if self.jobs.pop(name, None) is not None:
+            self._wakeup.set()
+            logger.info(f"Планировщик: задача {name} удалена")
+
+    def stats(self) -> dict:
+        return {name: job.stats() for name, job in self.jobs.items()}
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._stopping = False
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self, timeout: float = 30):
+        """Останавливает цикл и ждёт текущие запуски (не дольше timeout секунд)."""
+        if self._task is not None:
+            # Цикл не отменяется снаружи: он сам выходит, увидев _stopping
+            self._stopping = True
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        running = [job.task for job in self.jobs.values() if job.running]
+        if running:
+            _, pending = await asyncio.wait(running, timeout=timeout)
+            for task in pending:
+                task.cancel()
+
+    async def _run(self):
+        while not self._stopping:
+            now = datetime.now()
+            for job in list(self.jobs.values()):
+                if job.next_run is not None and job.next_run <= now:
+                    self._launch(job, now)
+            upcoming = [job.next_run for job in self.jobs.values() if job.next_run is not None]
+            timeout = (min(upcoming) - datetime.now()).total_seconds() if upcoming else None
+            self._wakeup.clear()
+            wakeup = asyncio.create_task(self._wakeup.wait())
+            try:
+                await asyncio.wait({wakeup}, timeout=max(timeout, 0) if timeout is not None else None)
+            finally:
+                wakeup.cancel()
+
+    def _launch(self, job: Job, now: datetime):
+        job.schedule_next(now)
+        if job.running:
+            job.skipped += 1
+            logger.warning(f"Планировщик: {job.name} ещё выполняется, запуск пропущен")
+            return
+        job.task = asyncio.create_task(self._execute(job))
+
+    async def _execute(self, job: Job):
+        job.last_started = datetime.now()
+        started = time.perf_counter()
+        try:
+            await job.func()
+            job.last_error = None
+        except Exception as e:
+            job.failures += 1
+            job.last_error = str(e)
+            logger.error(f"Планировщик: ошибка в задаче {job.name}: {e}")
+        finally:
+            job.last_duration = time.perf_counter() - started
+            job.total_duration += job.last_duration
+            job.runs += 1
+
+
+# Общий планировщик бота
+scheduler = Scheduler()
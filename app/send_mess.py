@@ -1,8 +1,7 @@
-import json
 import logging
 from aiogram import Router, F
 from aiogram.types import Message, ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardMarkup, InlineKeyboardButton, ReplyKeyboardRemove
-from app.handlers import get_user_role, load_access_data
+from app.access import access, Role
 from app.keyboards import edit_mashines, main, admin_menu
 
 # Роутер для рассылки
@@ -12,31 +11,10 @@ router_broadcast = Router()
 waiting_for_broadcast = {}  # user_id -> {"waiting": True, "text": str}
 
 
-def get_all_user_ids():
-    """
-    Читает access_user.json и возвращает set уникальных telegram_id из всех ролей.
-    """
-    try:
-        with open('json/access_user.json', 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        user_ids = set()
-        for role in ['main_admins', 'admins', 'users']:
-            user_ids.update(data.get(role, []))
-        return user_ids
-    except FileNotFoundError:
-        logging.error("Файл json/access_user.json не найден.")
-        return set()
-    except json.JSONDecodeError as e:
-        logging.error(f"Ошибка чтения JSON: {e}")
-        return set()
-
-
 @router_broadcast.message(F.text == '📢 Рассылка')
-async def start_broadcast(message: Message):
-    data = load_access_data()
+async def start_broadcast(message: Message, role: Role):
     user_id = message.from_user.id  # Получаем ID пользователя
-    role = get_user_role(user_id, data)
-    if role in ["👑 Главный администратор!"]:
+    if role == Role.MAIN_ADMIN:
         waiting_for_broadcast[user_id] = {
             "waiting": True, "text": None}  # Инициализируем состояние
         await message.answer("Введите текст для рассылки всем пользователям. После ввода вы увидите preview и сможете подтвердить или отменить.",
@@ -47,11 +25,9 @@ async def start_broadcast(message: Message):
 
 
 @router_broadcast.message(F.text)
-async def handle_broadcast_text(message: Message):
-    data = load_access_data()
+async def handle_broadcast_text(message: Message, role: Role):
     user_id = message.from_user.id  # Получаем ID пользователя
-    role = get_user_role(user_id, data)
-    if role in ["👑 Главный администратор!"]:
+    if role == Role.MAIN_ADMIN:
         if not waiting_for_broadcast.get(user_id, {}).get("waiting", False):
             # Тихий возврат, если процесс рассылки не начат
             return
@@ -82,11 +58,9 @@ async def handle_broadcast_text(message: Message):
 
 
 @router_broadcast.callback_query(F.data.startswith("broadcast:"))
-async def handle_broadcast_confirmation(callback):
+async def handle_broadcast_confirmation(callback, role: Role):
     user_id = callback.from_user.id
-    data = load_access_data()
-    role = get_user_role(user_id, data)
-    if role not in ["👑 Главный администратор!"]:
+    if role != Role.MAIN_ADMIN:
         await callback.answer("⛔ У вас нет доступа.", show_alert=True)
         return
 
@@ -103,8 +77,8 @@ async def handle_broadcast_confirmation(callback):
         waiting_for_broadcast[user_id] = {
             "waiting": False, "text": None}  # Сбрасываем состояние
 
-        # Получаем всех пользователей из JSON
-        user_ids = get_all_user_ids()
+        # Получаем всех пользователей из прав доступа
+        user_ids = access.all_ids()
         total_users = len(user_ids)
         if total_users == 0:
             # Случай без пользователей: отправляем отчет как новое сообщение с клавиатурой
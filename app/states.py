@@ -42,4 +42,5 @@ class Register(StatesGroup):
     waiting_for_search_phrase = State()
     viewing_record = State()
     editing_field = State()
-    confirming_edit = State()
\ No newline at end of file
+    confirming_edit = State()
+    restore_time = State()              # ввод даты и времени для восстановления БД (PITR)
\ No newline at end of file
@@ -1,4 +1,3 @@
-import os
 from aiogram import types, F, Router
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton, Message, CallbackQuery
 from aiogram.filters import StateFilter
@@ -6,33 +5,13 @@ from aiogram.fsm.context import FSMContext
 from app.states import Register
 from aiogram_calendar import SimpleCalendar, get_user_locale
 from datetime import datetime, time
-from app.data_shops import shops
-import json  # Оставляем для loads_machines_data
-from app.database import add_data 
+from app.database import add_data
+from app.catalog import catalog
 
 router_time = Router()
 
 
 
-def loads_machines_data():
-    if os.path.exists('json/machines_data.json'):
-        with open('json/machines_data.json', 'r', encoding='utf-8') as file:
-            return json.load(file)
-    else:
-        return {
-            "maschines_1": [],
-            "maschines_2": [],
-            "maschines_3": [],
-            "maschines_11": [],
-            "maschines_15": [],
-            "maschines_17": [],
-            "maschines_20": [],
-            "maschines_26": [],
-            "maschines_kmt": [],
-        }
-
-
-
 # Функция для создания клавиатуры с цифрами 0-9
 def number_keyboard(stage):
     kb = InlineKeyboardMarkup(inline_keyboard=[
@@ -360,13 +339,6 @@ async def cancel_work(callback: CallbackQuery, state: FSMContext):
     await state.set_state(Register.working)
 
 
-def get_inventory_number(item_name, items):
-    for item in items:
-        if item['name'] == item_name:
-            return item['inventory_number']
-    return None  # Если имя не найдено
-
-
 # Шаг 3: Решение проблемы
 @router_time.message(Register.working_solution)
 async def save_work_solution(message: Message, state: FSMContext):
@@ -431,11 +403,11 @@ async def confirm_save_data_fault_status(callback: types.CallbackQuery, state: F
     selected_date_start = data.get('selected_date_start')
     selected_date_end = data.get('selected_date_end')
 
-    shop_number = selected_shop.split('-')[0]
-    machines_data = loads_machines_data()
-    existing_machines = machines_data.get(f'maschines_{shop_number}', [])
-    inventory_number = get_inventory_number(
-        selected_machine, existing_machines)
+    selected_machine_id = data.get('selected_machine_id')
+
+    shop_title = catalog.shop_title(selected_shop.split('-')[0])
+    machine = catalog.machine(selected_machine_id)
+    inventory_number = machine['inventory_number'] if machine else None
 
     start_time = time(int(hours_start), int(minutes_start))
     end_time = time(int(hours_end), int(minutes_end))
@@ -466,7 +438,7 @@ async def confirm_save_data_fault_status(callback: types.CallbackQuery, state: F
         f"📅 <b>Дата начала:</b> {start_datetime_str}\n"
         f"📅 <b>Дата окончания:</b> {end_datetime_str}\n"
         f"⏳ <b>Затраченное время:</b> {result_duration}\n"
-        f"🏭 <b>Цех:</b> {shops.get(selected_shop, 'Не указан')}\n"
+        f"🏭 <b>Цех:</b> {shop_title}\n"
         f"🔧 <b>Станок:</b> {selected_machine}\n"
         f"🔢 <b>Инвентарный номер:</b> {inventory_number}\n"
     )
@@ -486,9 +458,11 @@ async def confirm_save_data_fault_status(callback: types.CallbackQuery, state: F
             start_time=start_datetime_str,
             end_time=end_datetime_str,
             duration=result_duration,
-            shift=shops.get(selected_shop, 'Не указан'),
+            shift=shop_title,
             machine=selected_machine,
-            inventory_number=inventory_number
+            inventory_number=inventory_number,
+            duration_minutes=int(duration.total_seconds() // 60),
+            machine_id=selected_machine_id
         )
         await callback.message.answer("✅ Данные успешно сохранены в базе!")
     except Exception as e:
@@ -1,6 +1,6 @@
 import asyncio
 from aiogram import Bot, Dispatcher
-from app.handlers import router, auto_backup_loop
+from app.handlers import router, schedule_auto_backup
 from app.timing import router_time
 from app.get_users_id import router_users_id
 from app.records import router_records
@@ -16,7 +16,14 @@ from dotenv import load_dotenv
 from aiogram.client.session.aiohttp import AiohttpSession
 import logging
 from logging.handlers import RotatingFileHandler
-from app.database import init_db
+from app.database import init_db, close_db
+from app.middlewares import RoleMiddleware
+from app.access import access
+from app.catalog import catalog
+from app.pitr import PITR_ENABLED, PITR_ARCHIVE_INTERVAL, start_pitr, stop_pitr, archive_wal
+from app.scheduler import scheduler, IntervalTrigger, CronTrigger
+from app.maintenance import MAINTENANCE_CRON, MAINTENANCE_JITTER, run_maintenance
+from datetime import datetime
 
 # Загружаем переменные окружения из .env файла
 load_dotenv()
@@ -52,6 +59,8 @@ storage = MemoryStorage()
 session = AiohttpSession()  # proxy="http://proxy.server:3128"
 bot = Bot(token=BOT_TOKEN, session=session)
 dp = Dispatcher(storage=storage)
+# Уровень доступа определяется один раз на апдейт и передаётся обработчикам как role
+dp.update.outer_middleware(RoleMiddleware())
 dp.include_router(router)
 dp.include_router(router_time)
 dp.include_router(router_users_id)
@@ -61,18 +70,27 @@ dp.include_router(router_logs)
 dp.include_router(router_broadcast)
 dp.include_router(router_database)
 
-# функция удаления файлов истории
+# функция удаления файлов истории (запускается планировщиком раз в час)
 async def periodic_cleanup():
-    while True:
-        logging.info("Запуск периодической очистки...")
-        cleanup_old_files()
-        await asyncio.sleep(3600)  # 60 минут проверка
+    logging.info("Запуск периодической очистки...")
+    cleanup_old_files()
 
 async def main():
     await init_db()  # Инициализация базы данных SQLite
+    await access.load()  # Права доступа из таблицы users в память
+    await catalog.load()  # Справочник цехов и станков в память
     dp.startup.register(set_main_menu)
-    asyncio.create_task(periodic_cleanup())
-    asyncio.create_task(auto_backup_loop())
+    dp.shutdown.register(scheduler.stop)  # Фоновые задачи завершаются первыми
+    dp.shutdown.register(stop_pitr)  # Остаток WAL в архив до закрытия БД
+    dp.shutdown.register(close_db)  # Закрытие пула соединений с БД
+    if PITR_ENABLED:
+        await start_pitr()
+        scheduler.add_job('wal_archive', archive_wal, IntervalTrigger(PITR_ARCHIVE_INTERVAL))
+    scheduler.add_job('cleanup_old_files', periodic_cleanup, IntervalTrigger(3600), first_run=datetime.now())
+    schedule_auto_backup()
+    # Обслуживание БД (ANALYZE, vacuum, проверка целостности) — ночью, вне смен
+    scheduler.add_job('maintenance', run_maintenance, CronTrigger(MAINTENANCE_CRON), jitter=MAINTENANCE_JITTER)
+    scheduler.start()
     await dp.start_polling(bot)
 
 if __name__ == '__main__':